@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from loguru import logger
+
+import main
+from models.Market import Market
+import utils.clock as clock
+from utils.candles import interval_to_ms
+from utils.constants import INTERVAL
+from utils.history import load_history
+from utils.indicators import RSI_history
+
+
+def backtest(symbols, times, closes, RSIs):
+    """Replay historical ticks through `main.trade` with a simulated clock. Return ticks traded."""
+    strategies = main.strategies
+
+    # NOTE: the history holds INTERVAL closes only; rolled-up RSIs are not replayed (yet)
+    for strategy in strategies:
+        if strategy.INTERVAL != INTERVAL:
+            raise ValueError(f'{strategy.name} trades {strategy.INTERVAL} candles; backtests replay {INTERVAL} ones')
+    index = {symbol: i for i, symbol in enumerate(symbols)}
+    interval = timedelta(milliseconds=interval_to_ms(INTERVAL))
+
+    # Loosest open triggers of all strategies: any other RSI cannot open a position
+    lowest_open = max(strategy.OPEN_RSI_MIN for strategy in strategies)
+    highest_open = min(strategy.OPEN_RSI_MAX for strategy in strategies)
+    macro_strategies = [strategy for strategy in strategies if strategy.MACRO_RSI]
+
+    # Candles are closed when replayed, so the tick happens at the close time
+    now = None
+    clock.set_source(lambda: now)
+
+    start = np.argmax(~np.isnan(RSIs).all(axis=1))  # first tick with any RSI
+    traded = 0
+
+    for t in range(start, len(times)):
+        RSI_row = RSIs[t]
+        macro_RSI = float(np.nanmean(RSI_row))
+
+        # Only pass symbols which can open or close a position; `trade` ignores the rest
+        if any(macro_RSI >= s.MACRO_RSI_MAX or macro_RSI <= s.MACRO_RSI_MIN for s in macro_strategies):
+            interesting = np.arange(len(symbols))
+        else:
+            interesting = set(np.flatnonzero((RSI_row <= lowest_open) | (RSI_row >= highest_open)))
+            interesting.update(index[p.symbol] for s in strategies for p in s.account.positions)
+
+            if not interesting:
+                continue
+
+            interesting = np.array(sorted(interesting))  # keep the live order (i.e. priority on ties)
+
+        # Symbols delisted (no close since) are left out; `trade` leaves their positions as they are
+        interesting = interesting[~np.isnan(closes[t, interesting])]
+
+        now = datetime.fromtimestamp(times[t] / 1000) + interval
+        main.macro_RSI = macro_RSI
+
+        main.trade({INTERVAL: Market(
+            [symbols[i] for i in interesting], closes[t, interesting], RSI_row[interesting].astype(np.float64)
+        )}, {INTERVAL: macro_RSI})
+        traded += 1
+
+    return traded
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='_> backtest Delfos')
+
+    parser.add_argument('id', help='backtest ID')
+    parser.add_argument('data', help='directory with one kline CSV/Parquet file per symbol')
+    parser.add_argument(
+        '--strategies', default='strategies.json', help='strategies file (default: strategies.json)'
+    )
+    args = parser.parse_args()
+
+    symbols, times, closes = load_history(args.data)
+
+    prefix = f'{args.id}_backtest'
+    full_path = main.create_session(prefix, args.strategies)
+
+    # Keep the replay quiet: only closed/opened positions reach the logs
+    logger.remove()
+    logger.add(f'{prefix}_tracking.log', level='INFO',
+        format='{time:MM-DD HH:mm:ss.SSS} | {level} | {message}'
+    )
+    logger.add(sys.stderr, level='INFO', colorize=True, format=
+        '<green>{time:MM-DD HH:mm:ss.SSS}</green> | <level>{message}</level>'
+    )
+
+    logger.info('Logging at: ' + full_path)
+    logger.info(f'INTERVAL: {INTERVAL}, {len(symbols)} symbols, {len(times)} candles')
+
+    main.setup_accounts_and_strategies(paper=True)
+
+    started_at = time.time()
+    logger.info('Computing RSIs...')
+    RSIs = RSI_history(closes)
+
+    logger.info('Replaying candles...')
+    traded = backtest(symbols, times, closes, RSIs)
+
+    logger.info(f'Replayed {len(times)} candles ({traded} traded) in {time.time() - started_at:.1f}s')
+
+    main.close_logs()
+
+    for account in main.accounts:
+        logger.info(account)
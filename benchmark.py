@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process, Queue
+from pathlib import Path
+from urllib import parse
+
+import numpy as np
+from loguru import logger
+
+import main
+from models.Account import Account
+from models.Market import Market
+from models.Position import Position
+from models.Strategy import Strategy
+import utils.aggregator as aggregator
+import utils.binance as binance
+from utils.candles import interval_to_ms
+import utils.clock as clock
+from utils.constants import INTERVAL
+from utils.signals import Signal, evaluate_signals
+from utils.timeframes import Timeframe
+import utils.weight as weight
+
+SYMBOLS = (10, 200, 1000)
+STRATEGIES = (1, 10, 100)
+STAGES = ('parse', 'fetch', 'RSI', 'roll_up', 'signals', 'should_close', 'account')
+ROLLED_UP = ('5m', '15m', '1h', '4h')  # timeframes the roll_up stage maintains from the fixtures' candles
+
+REPEATS = 7         # timed runs per stage and scale; the fastest is reported (least noisy)
+TOLERANCE = 0.25    # slowdown (or memory growth) over the baseline tolerated before failing
+MIN_SLACK = 0.0005  # seconds of noise tolerated on top, for sub-millisecond stages
+SEED = 42           # fixtures and strategies are generated deterministically from it
+
+INTERVAL_MS = interval_to_ms(INTERVAL)
+START = 1_630_454_400_000  # open time of the first generated candle (2021-09-01 UTC)
+CANDLES = aggregator.LOOKBACK + REPEATS + 2  # per fixture: a new candle per run (and warm-up/traced runs)
+
+DEFAULTS = {
+    'account_size': 1000.0, 'macro_RSI': False, 'macro_RSIs': [30, 70], 'open_RSIs': [30, 70],
+    'close_RSIs': [70, 30], 'mode': 'neutral', 'profit_close': False, 'risk': 0.01,
+    'stop_loss': 0.03, 'take_profit': 0.02, 'timer_trigger': 60,
+}
+
+fixtures = {}  # symbol -> raw /v1/klines response served by the stub server
+bodies = {}    # (symbol, limit) -> response body, sliced once so the stub stays out of the timings
+
+
+def generate_fixtures(n_symbols, directory=None):
+    """
+    Return the raw klines responses of `n_symbols` symbols, by symbol.
+
+    Responses recorded in `directory` (one `<BASE>USDT.json` per symbol) are replayed, and reused
+    under numbered symbols if there are fewer than needed. Otherwise random walks are generated.
+    Recorded responses need `CANDLES` klines (a new one per run) and are cut to their last `CANDLES`.
+    """
+    if directory is not None:
+        recorded = []
+
+        for path in sorted(Path(directory).glob('*.json')):
+            klines = json.loads(path.read_bytes())
+
+            if len(klines) < CANDLES:
+                raise ValueError(
+                    f'{path} has {len(klines)} klines; the RSI and roll_up stages need {CANDLES} '
+                    f'(i.e. record them with limit={CANDLES})'
+                )
+
+            recorded.append(json.dumps(klines[-CANDLES:]).encode())
+
+        if not recorded:
+            raise ValueError(f'No recorded klines (*.json) found in {directory}')
+
+        return {f'S{i}USDT': recorded[i % len(recorded)] for i in range(n_symbols)}
+
+    rng = np.random.default_rng(SEED)
+    responses = {}
+
+    for i in range(n_symbols):
+        closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, CANDLES)))
+        opens = np.concatenate(([closes[0]], closes[:-1]))
+        spreads = np.abs(rng.normal(0, 0.002, CANDLES)) * closes
+
+        klines = []
+        for j in range(CANDLES):
+            open_time = START + j * INTERVAL_MS
+            klines.append([
+                open_time, f'{opens[j]:.4f}', f'{max(opens[j], closes[j]) + spreads[j]:.4f}',
+                f'{min(opens[j], closes[j]) - spreads[j]:.4f}', f'{closes[j]:.4f}',
+                f'{rng.uniform(1e3, 1e6):.3f}', open_time + INTERVAL_MS - 1,
+                '0', 100, '0', '0', '0',
+            ])
+
+        responses[f'S{i}USDT'] = json.dumps(klines).encode()
+
+    return responses
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, as with Binance
+    disable_nagle_algorithm = True  # NOTE: otherwise every response waits for a delayed ACK
+
+    def do_GET(self):
+        """Serve /fapi/v1/klines from the fixtures, as Binance would (only the last `limit`)."""
+        url = parse.urlparse(self.path)
+        query = parse.parse_qs(url.query)
+
+        if url.path != '/fapi/v1/klines' or query['symbol'][0] not in fixtures:
+            self.send_error(400)
+            return
+
+        key = (query['symbol'][0], int(query['limit'][0]))
+        if key not in bodies:
+            bodies[key] = json.dumps(json.loads(fixtures[key[0]])[-key[1]:]).encode()
+
+        body = bodies[key]
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(responses, ports):
+    """Serve the given responses until killed, reporting the port (run in its own process)."""
+    fixtures.update(responses)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    ports.put(server.server_port)
+    server.serve_forever()
+
+
+def start_stub_server(responses):
+    """
+    Serve the fixtures on a local port and point the Binance client at it.
+
+    The stub runs in its own process, so it does not compete with the client for the GIL.
+    """
+    ports = Queue()
+    process = Process(target=serve, args=(responses, ports), name='stub', daemon=True)
+    process.start()
+
+    binance.BASEURL = f'http://127.0.0.1:{ports.get()}/fapi'
+    weight.WEIGHT_LIMIT = sys.maxsize  # the stub does not rate limit
+
+    return process
+
+
+def create_strategies(n_strategies):
+    """Return paper strategies with varied (deterministic) triggers, as a sweep would."""
+    modes = ('neutral', 'bullish', 'bearish')
+    strategies = []
+
+    for i in range(n_strategies):
+        strategy = Strategy(None, DEFAULTS, {
+            'mode': modes[i % 3], 'macro_RSI': i % 2 == 1,
+            'open_RSIs': [30 - i % 10, 70 + i % 10], 'close_RSIs': [70 - i % 5, 30 + i % 5],
+        })
+        strategies.append(strategy)
+
+    return strategies
+
+
+def open_positions(strategy, market, macro_RSI):
+    """Return a paper position on every symbol of the market, alternating sides."""
+    positions = []
+
+    for i, pair in enumerate(market):
+        side = 'buy' if i % 2 == 0 else 'sell'
+        signal = Signal(pair.symbol, float(pair.price), float(pair.RSI), side, 'reversal', 0.0)
+        positions.append(Position(signal, 10.0, strategy, macro_RSI))
+
+    return positions
+
+
+def prepare(stage, n_symbols, n_strategies, directory):
+    """Return the function running the stage once, and the number of items it processes."""
+    responses = generate_fixtures(n_symbols, directory)
+    symbols = [symbol[:-4] + '/USDT' for symbol in responses]
+
+    # Load the fixtures without HTTP for the stages which only need the market
+    aggregator.allocate(symbols)
+    for i, content in enumerate(responses.values()):
+        aggregator.store.load(i, binance.parse_klines(content)[:aggregator.LOOKBACK])
+
+    candles = aggregator.store.matrix()
+    RSIs = aggregator.update_RSIs(candles['time'], candles['close'])
+    market = Market(symbols, candles['close'][:, -1], RSIs, candles)
+    macro_RSI = float(np.nanmean(RSIs))
+
+    now = datetime.fromtimestamp(candles['time'][0, -1] / 1000) + timedelta(minutes=30)
+    clock.set_source(lambda: now)
+
+    if stage == 'parse':
+        contents = list(responses.values())
+
+        def run():
+            for content in contents:
+                binance.parse_klines(content)['close']
+
+        return run, n_symbols
+
+    if stage == 'fetch':
+
+        def run():
+            aggregator.allocate(symbols)  # full warm-up requests
+            aggregator.fetch_candles(symbols)
+
+        return run, n_symbols
+
+    if stage == 'RSI':
+        parsed = [binance.parse_klines(content) for content in responses.values()]
+        times = np.array([klines['time'] for klines in parsed])
+        closes = np.array([klines['close'] for klines in parsed])
+        windows = iter(range(1, CANDLES - aggregator.LOOKBACK + 1))
+
+        # Every run commits the candle which closed since the previous one (seeded below)
+        def run():
+            start = next(windows)
+            window = slice(start, start + aggregator.LOOKBACK)
+            aggregator.update_RSIs(times[:, window], closes[:, window])
+
+        aggregator.allocate(symbols)
+        aggregator.update_RSIs(times[:, :aggregator.LOOKBACK], closes[:, :aggregator.LOOKBACK])
+
+        return run, n_symbols
+
+    if stage == 'roll_up':
+        klines = np.array([binance.parse_klines(content) for content in responses.values()])
+        windows = iter(range(1, CANDLES - aggregator.LOOKBACK + 1))
+        timeframes = [Timeframe(interval, symbols, aggregator.LOOKBACK) for interval in ROLLED_UP]
+
+        # Rows roll up from the first window's last closed candle on, as once loaded
+        for timeframe in timeframes:
+            timeframe.folded[:] = klines['time'][:, aggregator.LOOKBACK - 2]
+
+        # Every run folds the candle which closed since the previous one, and the forming one
+        def run():
+            start = next(windows)
+
+            for timeframe in timeframes:
+                timeframe.roll_up(klines[:, start:start + aggregator.LOOKBACK])
+
+        return run, n_symbols * len(timeframes)
+
+    if stage == 'signals':
+        strategies = create_strategies(n_strategies)
+
+        def run():
+            evaluate_signals(market, macro_RSI, strategies)
+
+        return run, n_symbols * n_strategies
+
+    strategy = create_strategies(1)[0]
+
+    if stage == 'should_close':
+        strategy.account = Account(DEFAULTS['account_size'])
+        for position in open_positions(strategy, market, macro_RSI):
+            strategy.account.positions.add(position)
+
+        arrays = strategy.account.positions.arrays()
+        prices, RSIs = market.prices * 1.01, RSIs[::-1].copy()
+
+        def run():
+            strategy.should_close_all(arrays, prices, RSIs, macro_RSI, now)
+
+        return run, n_symbols
+
+    if stage == 'account':
+        account, strategy = main.create_strategy(DEFAULTS, {})
+
+        # Open/dump/close cycle of a position on every symbol: book, ledger, and opened.json writes
+        def run():
+            positions = open_positions(strategy, market, macro_RSI)
+
+            for position in positions:
+                account.log_new_position(position)
+            account.log_open_positions(force=True)
+
+            for position in positions:
+                position.close(market.pair(position.symbol), strategy, 'timer', macro_RSI)
+                account.log_closed_position(position)
+            account.log_open_positions(force=True)
+
+        return run, 2 * n_symbols
+
+    raise ValueError(f'Unknown stage: {stage}')
+
+
+def measure(run):
+    """Return the seconds of the fastest of REPEATS runs, and the peak memory allocated by a run."""
+    run()  # warm-up (e.g. lazy imports, caches)
+
+    durations = []
+    for _ in range(REPEATS):
+        started_at = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - started_at)
+
+    # Traced separately: tracemalloc slows allocations down a lot
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(durations), peak
+
+
+def benchmark(stages, symbol_scales, strategy_scales, directory=None):
+    """Run every stage at every scale. Return the results by `<stage>/<symbols>x<strategies>`."""
+    results = {}
+
+    for stage in stages:
+        for n_symbols in symbol_scales:
+            # Only the signals depend on the number of strategies
+            for n_strategies in strategy_scales if stage == 'signals' else (1,):
+                run, items = prepare(stage, n_symbols, n_strategies, directory)
+                seconds, peak = measure(run)
+
+                key = f'{stage}/{n_symbols}x{n_strategies}'
+                results[key] = {'seconds': seconds, 'throughput': items / seconds, 'peak_bytes': peak}
+
+                logger.info(
+                    f'{key:<22} {seconds * 1000:>10.3f} ms {items / seconds:>14,.0f} items/s '
+                    f'{peak / 1024:>10,.1f} KiB'
+                )
+
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Return a description of every result slower or bigger than its baseline (beyond tolerance)."""
+    regressions = []
+
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+
+        base = baseline[key]
+
+        if result['seconds'] > base['seconds'] * (1 + tolerance) + MIN_SLACK:
+            regressions.append(
+                f'{key}: {result["seconds"] * 1000:.3f} ms vs {base["seconds"] * 1000:.3f} ms baseline'
+            )
+        if result['peak_bytes'] > base['peak_bytes'] * (1 + tolerance):
+            regressions.append(
+                f'{key}: {result["peak_bytes"] / 1024:,.1f} KiB vs {base["peak_bytes"] / 1024:,.1f} KiB baseline'
+            )
+
+    return regressions
+
+
+def parse_scales(text):
+    return [int(scale) for scale in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='_> benchmark Delfos\' tick pipeline')
+
+    parser.add_argument(
+        '--stages', type=lambda text: text.split(','), default=list(STAGES),
+        help=f'comma-separated stages to run (default: {",".join(STAGES)})'
+    )
+    parser.add_argument(
+        '--symbols', type=parse_scales, default=list(SYMBOLS), help='comma-separated numbers of symbols'
+    )
+    parser.add_argument(
+        '--strategies', type=parse_scales, default=list(STRATEGIES), help='comma-separated numbers of strategies'
+    )
+    parser.add_argument(
+        '--fixtures', metavar='DIR', help='recorded /v1/klines responses (default: generated random walks)'
+    )
+    parser.add_argument('--baseline', metavar='FILE', help='fail if slower or bigger than these results')
+    parser.add_argument(
+        '--tolerance', type=float, default=TOLERANCE, help=f'tolerated regression (default: {TOLERANCE})'
+    )
+    parser.add_argument('--save', metavar='FILE', help='write the results (e.g. as the next baseline)')
+    args = parser.parse_args()
+
+    for path in ('baseline', 'save', 'fixtures'):
+        if getattr(args, path) is not None:
+            setattr(args, path, os.path.abspath(getattr(args, path)))
+
+    # Fail early (rather than timing no-ops) on recordings too short to replay
+    if args.fixtures is not None:
+        try:
+            generate_fixtures(1, args.fixtures)
+        except ValueError as e:
+            parser.error(str(e))
+
+    logger.remove()
+    logger.add(sys.stderr, level='INFO', format='<level>{message}</level>')
+
+    # Account writes (ledger and opened.json) go to a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix='delfos-benchmark-'))
+
+    # Fixtures are generated in the same order at every scale, so the biggest one holds them all
+    if 'fetch' in args.stages:
+        start_stub_server(generate_fixtures(max(args.symbols), args.fixtures))
+
+    logger.info(f'INTERVAL: {INTERVAL}, best of {REPEATS} runs per stage')
+    results = benchmark(args.stages, args.symbols, args.strategies, args.fixtures)
+
+    if args.save:
+        with open(args.save, 'w') as fd:
+            fd.write(json.dumps(results, indent=4) + '\n')
+
+        logger.info(f'Results saved to {args.save}')
+
+    if args.baseline:
+        with open(args.baseline) as fd:
+            regressions = compare(results, json.loads(fd.read()), args.tolerance)
+
+        if regressions:
+            for regression in regressions:
+                logger.critical('REGRESSION ' + regression)
+
+            sys.exit(1)
+
+        logger.success(f'No regression over {args.baseline} (tolerance: {args.tolerance:.0%})')
@@ -3,26 +3,43 @@ import argparse
 import json
 import math
 import sys
+import time
 from datetime import datetime
 from os import chdir, listdir
 from pathlib import Path
 from shutil import copyfile
 
 import ccxt
+import numpy as np
 from loguru import logger
 
 from models.Account import Account
-from models.Position import Position
-from models.Strategy import Strategy
+from models.Market import Market
+from models.Pair import Pair
+from models.Strategy import Strategy, TRIGGERS
 from models.Trader import Trader
 import utils.aggregator as aggregator
+import utils.clock as clock
+import utils.ledger as ledger
+import utils.metrics as metrics
+import utils.orders as orders
+import utils.retry as retry
+import utils.shards as shards
+import utils.snapshot as snapshot
+import utils.telemetry as telemetry
+import utils.weight as weight
+from utils.ledger import Ledger
+from utils.signals import evaluate_timeframes
+from utils.userstream import UserStream
 from utils.constants import INTERVAL
 
 accounts, strategies, symbols = [], [], []
 trader, exchange = None, None
+macro_RSI = None
+signaled_at = 0.0  # `time.perf_counter()` when the last signals were evaluated
 
 emojis = {
-    True:  '💎', False:  '❌',
+    True:  '💎', False:  '❌', None: '❔',
     'buy': '🐃', 'sell': '🐻',
 }
 
@@ -38,79 +55,173 @@ def main():
     symbols = trader.symbols
     logger.info(f'🪙  Loaded {len(symbols)} symbols')
 
-    setup_accounts_and_strategies()
+    try:
+        aggregator.set_intervals(read_intervals())
+    except ValueError as e:
+        logger.critical(f'{e}; exiting...')
+        sys.exit(1)
+
+    logger.info(f'🕰  Rolling up {INTERVAL} candles into {", ".join(aggregator.intervals)}')
+
+    restored, user_stream = None, None
+    if args.resume:
+        restored, macro_RSI, arrays = snapshot.load()
+
+        if arrays:
+            resumed = aggregator.restore(symbols, arrays)
+            logger.info(f'⏪ Restored the candles and RSIs of {resumed}/{len(symbols)} symbols')
+
+    # Supervisor mode: paper strategies are traded by shard processes
+    shard = (shards.SUPERVISOR, args.workers) if args.workers else None
+
+    setup_accounts_and_strategies(restored=restored, shard=shard)
     logger.info(f'💡 Loaded {len(strategies)} strategies')
 
+    if args.workers:
+        logger.debug(f'🧩 Starting {args.workers} shards...')
+
+        if not shards.start(args.workers, symbols, aggregator.intervals, run_shard, args.resume is not None):
+            logger.critical('Failed starting the shards; dumping and exiting...')
+            close_logs()
+            return
+
+    if exchange is not None:
+        logger.debug('📡 Subscribing to the user-data stream...')
+        user_stream = UserStream(exchange)
+
+        for account in accounts:
+            if account.strategy.REAL:
+                account.stream = user_stream
+                user_stream.subscribe(account.update_balance)
+
+        user_stream.start()
+
+    if args.resume and exchange is not None:
+        logger.debug('Reconciling resumed positions with the exchange...')
+
+        # Log the positions whose SL/TP filled while down; their exit price comes from the order
+        real_accounts = [account for account in accounts if account.strategy.REAL]
+
+        for account, position, trigger in trader.reconcile_positions(real_accounts):
+            close_position(position, Pair(position.symbol, math.nan, math.nan), account.strategy, trigger, macro_RSI)
+
+    stream = None
+    if args.stream:
+        logger.debug('📡 Warming up candles and subscribing to kline streams...')
+        stream, HTTP_error = aggregator.start_stream(symbols)
+
+        if HTTP_error:
+            logger.critical(f'HTTP error {HTTP_error[0]} at /v1/klines endpoint; dumping and exiting...')
+            logger.critical(HTTP_error[1])
+            close_logs()
+            return
+
+        logger.info(stream)
+
     while True:
         try:
+            # Trade as soon as any streamed candle updates
+            if stream is not None:
+                stream.wait()
+
+            tick_started_at = time.perf_counter()
             logger.debug('📡 Aggregating market data...')
 
             # Catch openssl socket connection error
             try:
-                pairs, macro_RSI, HTTP_error = aggregator.get_market_data(symbols)
+                markets, macro_RSIs, HTTP_error = aggregator.get_market_data(symbols, fetch=stream is None)
             except OSError as e:
                 logger.error(f'Crashed on market data request: {e}')
                 continue
 
+            # The weight scheduler holds requests until the ban is over: just skip the tick
+            if HTTP_error and HTTP_error[0] in weight.RATE_LIMITED:
+                logger.error(f'HTTP error {HTTP_error[0]} at /v1/klines endpoint; backing off...')
+                continue
+
             if HTTP_error:
                 logger.critical(f'HTTP error {HTTP_error[0]} at /v1/klines endpoint; dumping and exiting...')
                 logger.critical(HTTP_error[1])
+                close_logs()
                 return
 
-            logger.debug(f'🎛  Macro-RSI: {macro_RSI:.2f}')
+            macro_RSI = macro_RSIs[INTERVAL]
+
+            for interval, interval_macro_RSI in macro_RSIs.items():
+                logger.debug(f'🎛  Macro-RSI ({interval}): {interval_macro_RSI:.2f}')
+
+            # Shards trade the same markets while the supervisor trades its own strategies
+            if shards.workers:
+                shards.publish(markets, macro_RSIs, clock.now())
+
+            trade(markets, macro_RSIs)
 
-            trade(pairs)
+            if shards.workers and not shards.collect():
+                logger.critical('A shard failed; dumping and exiting...')
+                close_logs()
+                return
+
+            # Crash-safe state for `--resume` (throttled)
+            snapshot.save(accounts, macro_RSI, aggregator.state)
+
+            metrics.observe('tick', time.perf_counter() - tick_started_at)
         except KeyboardInterrupt:
             logger.warning('Heard CTRL-C!')
             logger.warning('Quit now? All open positions will be CLOSED! (y/N) ', end='')
             answer = input()
 
             if answer == 'y' or answer == 'Y':
+                if stream is not None:
+                    stream.stop()
+
+                if user_stream is not None:
+                    user_stream.stop()
+
                 if exchange is not None:
                     trader.close_all_positions()
 
                 # TODO: iterate through accounts, close positions and call account.log_closed_position()
 
+                close_logs()
+
                 logger.info('Exited gracefully.')
                 return
 
 
-def setup_accounts_and_strategies():
-    """Parse JSON strategies and set up an account and directory for new ones."""
+def setup_accounts_and_strategies(paper=False, restored=None, shard=None):
+    """
+    Parse JSON strategies and set up an account and directory for new ones. Paper ignores REAL.
+
+    When resuming, `restored` maps strategy names to the (counters, positions) to restore. In
+    supervisor mode, only the strategies of the `(index, count)` shard are set up (see `shards.owns`).
+    """
     global exchange
 
     with open('strategies.json') as fd:
         data = json.loads(fd.read())
 
-    for raw_strategy in data['strategies']:
-        try:
-            initial_account_size = raw_strategy['account_size'] \
-                if 'account_size' in raw_strategy.keys() \
-                else data['defaults']['account_size']
+    for i, raw_strategy in enumerate(data['strategies']):
+        if shard is not None and not shards.owns(shard, i, raw_strategy):
+            continue
 
-            account = Account(initial_account_size)
-            strategy = Strategy(account, data['defaults'], raw_strategy)
+        if paper:
+            raw_strategy['REAL'] = False
 
-            account.strategy = strategy
-            account.free_trading_slots = math.floor(
-                account.available * strategy.STOP_LOSS * strategy.RISK * 100
-            )
+        try:
+            account, strategy = create_strategy(data['defaults'], raw_strategy, resume=restored is not None)
+
+            if restored is not None and strategy.name in restored:
+                snapshot.restore(account, *restored[strategy.name])
 
             if strategy.REAL:
                 exchange = trader.exchange
-                trader.setup_real_account(account, args.reset)
-
                 strategy.exchange = exchange   # link the trader object to the strategy
+
+                trader.setup_real_account(account, args.reset, resume=restored is not None)
         except KeyError as e:
             logger.critical(f'Required strategy parameter {e} missing, exiting...')
             sys.exit(1)
 
-        # Create files for position tracking
-        with open(strategy.name + '__closed.json', 'w') as fd1, \
-            open(strategy.name + '__opened.json', 'w') as fd2:
-            fd1.write('[]\n')
-            fd2.write('[]\n')
-
         accounts.append(account)
         strategies.append(strategy)
 
@@ -118,68 +229,208 @@ def setup_accounts_and_strategies():
         logger.info(account)
 
 
-def trade(pairs):
-    """Close positions which need so, store interesting pairs, and open positions if possible."""
-    logged_pairs = []
+def close_logs():
+    """Flush opened.json dumps, telemetry, and the snapshot; convert the ledgers to `__closed.json`."""
+    shards.stop()  # shards flush theirs first
+
+    snapshot.save(accounts, macro_RSI, aggregator.state, force=True)
+    snapshot.close()
+
+    for account in accounts:
+        account.log_open_positions(force=True)
+
+        account.ledger.close()
+        ledger.to_json(account.ledger.path)
+
+    telemetry.close()
+
+
+def read_intervals(path='strategies.json'):
+    """Return the intervals of all strategies, including those traded by shards."""
+    with open(path) as fd:
+        data = json.loads(fd.read())
+
+    default = data['defaults'].get('interval', INTERVAL)
+
+    return [raw_strategy.get('interval', default) for raw_strategy in data['strategies']]
+
+
+def run_shard(index, count, segment_name, connection, shard_symbols, intervals, resume):
+    """Trade a shard of the paper strategies on the markets published by the supervisor (own process)."""
+    global macro_RSI, symbols
+
+    shards.init_shard()
+    symbols = shard_symbols
+
+    segment = shards.MarketSegment(len(symbols), intervals, segment_name)
+    now = None
+    clock.set_source(lambda: now)  # the supervisor's tick time
+
+    snapshot.open_snapshot()
+    tick = 0
 
-    for strategy in strategies:
+    try:
+        setup_accounts_and_strategies(restored=snapshot.load()[0] if resume else None, shard=(index, count))
+        logger.info(f'🧩 Shard {index} loaded {len(strategies)} strategies')
+        shards.reply(connection, tick)
+
+        while (message := connection.recv()) is not None:
+            tick = message
+            macro_RSIs, now, prices, RSIs = segment.read()
+            macro_RSI = macro_RSIs[INTERVAL]
+
+            trade({interval: Market(symbols, prices, RSIs[interval]) for interval in intervals}, macro_RSIs)
+            snapshot.save(accounts, macro_RSI, dict)
+
+            shards.reply(connection, tick)
+
+        close_logs()
+    except Exception as e:
+        logger.exception(f'Shard {index} crashed: {e}')
+        shards.reply(connection, tick, ok=False)
+    else:
+        shards.reply(connection, tick)
+    finally:
+        segment.close()
+
+
+def create_strategy(defaults, raw_strategy, resume=False):
+    """Create a strategy, its account, and its tracking files. Raise KeyError on missing parameters."""
+    initial_account_size = raw_strategy['account_size'] \
+        if 'account_size' in raw_strategy.keys() \
+        else defaults['account_size']
+
+    account = Account(initial_account_size)
+    strategy = Strategy(account, defaults, raw_strategy)
+
+    account.strategy = strategy
+    account.free_trading_slots = math.floor(
+        account.available * strategy.STOP_LOSS * strategy.RISK * 100
+    )
+
+    # Create files for position tracking
+    account.ledger = Ledger(strategy.name + '__closed.jsonl')  # appended to when resuming
+
+    if not resume:
+        with open(strategy.name + '__opened.json', 'w') as fd:
+            fd.write('[]\n')
+
+    return account, strategy
+
+
+@metrics.timed('trade')
+def trade(markets, macro_RSIs):
+    """
+    Close positions which need so, store interesting signals, and open positions if possible.
+
+    Each strategy trades the market and macro-RSI of its interval (all markets share their symbols).
+    """
+    global signaled_at
+
+    logged_pairs = set()
+    now = clock.now()  # a single clock read per tick
+    signaled_at = time.perf_counter()
+
+    # Strategies sharing the same interval and triggers share their signals (each gets its own immutable copy)
+    signals = evaluate_timeframes(markets, macro_RSIs, strategies)
+
+    for strategy, potential in zip(strategies, signals):
         account = strategy.account
+        market, macro_RSI = markets[strategy.INTERVAL], macro_RSIs[strategy.INTERVAL]
+        closed_symbols = set()
 
-        opened_positions = {}
-        for position in account.positions:
-            opened_positions[position.symbol] = position
+        logger.debug(f'🔍 Checking {len(account.positions)} positions for {strategy.name}...')
 
-        logger.debug(f'🔍 Checking {len(opened_positions)} positions for {strategy.name}...')
+        # First, close all necessary positions for the given strategy, evaluated all at once
+        positions = account.positions.arrays()
+        rows = np.array([market.index.get(symbol, -1) for symbol in positions.symbols], dtype=np.intp)
 
-        # First, close all necessary positions for the given strategy
-        for pair in pairs:
-            if pair.symbol in opened_positions:
-                position = opened_positions[pair.symbol]
+        if len(rows):
+            needs_to_close, triggers = strategy.should_close_all(
+                positions, market.prices[rows], market.RSIs[rows], macro_RSI, now
+            )
 
-                # HACK: move function to a Position method(?)
-                needs_to_close, trigger = strategy.should_close(position, pair, macro_RSI)
+            # SL/TP fills pushed by the user-data stream take precedence over the price-based guess
+            streamed = set()
 
-                if needs_to_close:
-                    close_position(position, pair, strategy, trigger)
+            if account.stream is not None:
+                for j, position in enumerate(positions.positions):
+                    trigger = account.stream.exit_trigger(position)
 
-                if pair.symbol not in logged_pairs:
-                    with open('price-history.csv', 'a') as fd:
-                        fd.write(f'{pair.symbol[:-5]},{pair.price},{pair.RSI},{datetime.now()}\n')
+                    if trigger is not None:
+                        needs_to_close[j], triggers[j] = True, TRIGGERS.index(trigger)
+                        streamed.add(j)
 
-                    logged_pairs.append(pair.symbol)
+            # Positions of symbols missing from the market are left as they are, unless filled on exchange
+            for j in np.flatnonzero(rows < 0):
+                if j in streamed:
+                    position = positions.positions[j]
+                    pair = Pair(position.symbol, math.nan, math.nan)
+
+                    close_position(position, pair, strategy, TRIGGERS[triggers[j]], macro_RSI)
+                    closed_symbols.add(position.symbol)
+
+            order = [j for j in np.argsort(rows, kind='stable') if rows[j] >= 0]
+            closing = [
+                (positions.positions[j], market[rows[j]], TRIGGERS[triggers[j]])
+                for j in order if needs_to_close[j]
+            ]
+
+            # REAL positions send their closing orders at once; bookkeeping stays in order below
+            if strategy.REAL:
+                futures = orders.close_positions(strategy, closing, macro_RSI)
+            else:
+                futures = [None] * len(closing)
 
-            # Store pairs hitting price signal and calculate its tactic and strength
-            if pair.is_interesting(macro_RSI, strategy):
-                account.potential.append(pair)
+            closings = {position.symbol: future for (position, _, _), future in zip(closing, futures)}
 
-        # Then, sort potential pairs so most extreme RSIs get priority (i.e. positions are opened first)
-        account.potential.sort(key=lambda p: p.strength, reverse=True)
+            for j in order:
+                pair = market[rows[j]]
+
+                if needs_to_close[j]:
+                    close_position(
+                        positions.positions[j], pair, strategy, TRIGGERS[triggers[j]], macro_RSI,
+                        closings[pair.symbol]
+                    )
+                    closed_symbols.add(pair.symbol)
+
+                if pair.symbol not in logged_pairs:
+                    base_pair = markets[INTERVAL][rows[j]]
+                    telemetry.write('price-history', pair.symbol[:-5], pair.price, base_pair.RSI, now)
+
+                    logged_pairs.add(pair.symbol)
+
+        # Signals come sorted so most extreme RSIs get priority (i.e. positions are opened first)
+        account.potential = potential
 
         logger.debug(f'🔎 Got {len(account.potential)} potential positions...')
 
         # Finally, open the interesting positions
-        open_new_positions(strategy, opened_positions)
+        open_new_positions(strategy, closed_symbols, macro_RSI)
 
-        # Dump open positions to opened.json
+        # Dump open positions to opened.json (only when changed)
         account.log_open_positions()
 
-        # All potential positions have been opened so reset the array for the next round
+        # All potential positions have been opened so reset them for the next round
         account.potential = []
 
 
-def close_position(position, pair, strategy, trigger):
-    """Wrapper for closing positions."""
+def close_position(position, pair, strategy, trigger, macro_RSI, closing=None):
+    """Wrapper for closing positions. `closing` is the future of orders already sent, if any."""
     account = strategy.account
 
     try:
-        position.close(pair, strategy, trigger, macro_RSI)
+        if closing is not None:
+            closing.result()
+        else:
+            position.close(pair, strategy, trigger, macro_RSI)
     # NOTE: catch -2019 error (margin is insufficient)
     except ccxt.InsufficientFunds as e:
         # TODO: retrieve balance
         logger.critical('InsufficientFunds: failed closing ' \
             f'{position.side} {pair.symbol} with ${position.cost:.4f} ({e})'
         )
-        balance = strategy.exchange.fetch_balance()['USDT']
+        balance = retry.call('fetch_balance', strategy.exchange.fetch_balance)['USDT']
 
         logger.warning(account)
         account.allocated, account.available = balance['used'], balance['free']
@@ -187,19 +438,23 @@ def close_position(position, pair, strategy, trigger):
 
         return
     except ccxt.NetworkError as e:
+        # NOTE: the position stays open, so its exit is evaluated (and retried) again next tick
         logger.error('NetworkError: failed closing ' \
             f'{position.side} {pair.symbol} with ${position.cost:.4f} ({e})'
         )
 
-        # Try closing the position it again
-        close_position(position, pair, strategy, trigger)
+        return
+
+    # Positions closed on exchange by other means may have an unknown exit price (and P&L)
+    won = position.net_pnl >= 0 if position.net_pnl is not None else None
+    pnl = f'{position.pnl:.2f}%, ${position.net_pnl:.4f}' if position.net_pnl is not None else 'unknown'
 
     # Optimization happening here, baby ;)
     msg = ('\n'
         f'     🔮 Strategy: {strategy.name}\n'
         f'     🧭 Tactic: {position.entry_trigger}\n'
-        f'     {emojis[position.net_pnl >= 0]} Closed {position.symbol} {position.side} at {position.exit_price}\n'
-        f'     💸 P&L: {position.pnl:.2f}%, ${position.net_pnl:.4f}\n'
+        f'     {emojis[won]} Closed {position.symbol} {position.side} at {position.exit_price}\n'
+        f'     💸 P&L: {pnl}\n'
         f'     🧨 Fee: ${position.fee:.4f}\n'
         '     '
     )
@@ -208,16 +463,14 @@ def close_position(position, pair, strategy, trigger):
         position.exit_trigger = 'trend-tactic'
         msg += '🎛 Trend signal hit\n'
 
-        with open('macro-close.csv', 'a') as fd:
-            fd.write(f'{str(position.__dict__)},{str(pair.__dict__)},{macro_RSI:.2f}\n')
+        log_macro_close(position, trigger)
     elif trigger == 'reversal-tactic':
         position.exit_trigger = 'reversal-tactic'
         msg += '📞 Reversal signal hit\n'
     elif trigger == 'macro-opposed':
         msg += '❌ Macro early-close\n'
 
-        with open('macro-close.csv', 'a') as fd:
-            fd.write(f'{str(position.__dict__)},{str(pair.__dict__)},{macro_RSI:.2f}\n')
+        log_macro_close(position, trigger)
     elif trigger == 'SL':
         position.exit_trigger = 'SL'
         msg += '⛔️ SL hit\n'
@@ -227,8 +480,12 @@ def close_position(position, pair, strategy, trigger):
     elif trigger == 'timer':
         position.exit_trigger = 'timer'
         msg += '⏱ Timer hit\n'
+    elif trigger == 'external':
+        position.exit_trigger = 'external'
+        msg += '🖐 Closed on exchange (not by SL/TP)\n'
 
     account.log_closed_position(position)
+    metrics.inc('closed_positions', trigger=trigger)
 
     logger.warning(msg)
 
@@ -249,60 +506,68 @@ def close_position(position, pair, strategy, trigger):
     )
 
 
-def open_new_positions(strategy, opened_positions):
+def log_macro_close(position, trigger):
+    """Log a position closed by a macro-RSI signal for post-analysis."""
+    telemetry.write('macro-close',
+        position.symbol[:-5], position.side, trigger, position.entry_trigger,
+        position.entry_price, position.exit_price, position.entry_RSI, position.exit_RSI,
+        position.entry_macro_RSI, position.exit_macro_RSI, position.pnl, position.net_pnl,
+        position.opened_at, position.closed_at,
+    )
+
+
+@metrics.timed('open_positions')
+def open_new_positions(strategy, closed_symbols, macro_RSI):
     """Open positions based on RSI strength. Ensure no more than 1 position per symbol is opened."""
     account = strategy.account
     msg = '🔮 Opened positions for ' + strategy.name
 
-    for pair in account.potential:
-        # Do not open a new position if there's an existing position with the same symbol
-        if pair.symbol in opened_positions:
-            continue
+    # Do not open a new position if there's an existing position with the same symbol or one was just closed
+    signals = [
+        signal for signal in account.potential
+        if signal.symbol not in account.positions and signal.symbol not in closed_symbols
+    ]
 
-        # HACK: for real accounts, calculate using free balance from Binance
-        cost = strategy.determine_position_cost() / 5  # divide for testing purposes
+    for signal, cost, opening in orders.open_positions(strategy, signals, macro_RSI):
+        try:
+            position = opening()
+        # NOTE: cath -2019 error (margin is insufficient)
+        except ccxt.InsufficientFunds as e:
+            logger.error(
+                f'InsufficientFunds: failed opening {signal.side} {signal.symbol} with ${cost:.4f}'
+            )
 
-        # This check is needed in the edge case of `strategy.RISK > strategy.STOP_LOSS`
-        if cost <= account.available and account.free_trading_slots >= 1:
-            try:
-                position = Position(pair, cost, strategy, macro_RSI)
-            # NOTE: cath -2019 error (margin is insufficient)
-            except ccxt.InsufficientFunds as e:
-                logger.error(
-                    f'InsufficientFunds: failed opening {pair.side} {pair.symbol} with ${cost:.4f}'
-                )
-
-                logger.warning(account)
-                logger.warning(strategy.exchange.fetch_balance()['USDT'])
-
-                # TODO: create function for opening position and call it again here: recursion!
-                # For insufficient margin, try opening the position with smaller cost (-10%).
-                # position = Position(pair, side, cost - (cost*.1), strategy)
-                continue
-            # NOTE: catch -4003 error (quantity less than zero)
-            # HACK: check `tentative_size <= exchange.markets['limits']['amount']['min']` before creating order
-            except ccxt.ExchangeError as e:
-                logger.error(
-                    f'Failed opening {pair.side} {pair.symbol} with ${cost:.4f} ({(cost / pair.price):.4f}): {e}'
-                )
+            logger.warning(account)
+            logger.warning(retry.call('fetch_balance', strategy.exchange.fetch_balance)['USDT'])
 
-                continue
-            except ccxt.NetworkError as e:
-                logger.error(
-                    f'NetworkError: failed opening {pair.side} {pair.symbol} with ${cost:.4f} ({e})'
-                )
-                logger.error(account)
+            # TODO: create function for opening position and call it again here: recursion!
+            # For insufficient margin, try opening the position with smaller cost (-10%).
+            # position = Position(signal, side, cost - (cost*.1), strategy)
+            continue
+        # NOTE: also catches orders rejected locally for their size (see `markets.check_order`)
+        except ccxt.ExchangeError as e:
+            logger.error(
+                f'Failed opening {signal.side} {signal.symbol} with ${cost:.4f} ({(cost / signal.price):.4f}): {e}'
+            )
 
-                continue
+            continue
+        except ccxt.NetworkError as e:
+            logger.error(
+                f'NetworkError: failed opening {signal.side} {signal.symbol} with ${cost:.4f} ({e})'
+            )
+            logger.error(account)
 
-            account.log_new_position(position)
+            continue
 
-            # HACK: improve spacing: use :>x syntax
-            msg += (f'\n{emojis[pair.side]:>6} {pair.symbol} {pair.side} at {position.entry_price} with ${position.cost:.4f}\n'
-                f'     🚫 SL: {position.stop_loss:.4f}\t\t 🤝 TP: {position.take_profit:.4f}\n'
-                f'     📈 RSI: {position.entry_RSI:.2f}\t\t 🎛  Macro-RSI: {position.entry_macro_RSI:.2f}\n'
-                f'     🧭 Tactic: {position.entry_trigger}\n'
-            )
+        account.log_new_position(position)
+        metrics.observe('signal_to_order', time.perf_counter() - signaled_at, real=strategy.REAL)
+
+        # HACK: improve spacing: use :>x syntax
+        msg += (f'\n{emojis[signal.side]:>6} {signal.symbol} {signal.side} at {position.entry_price} with ${position.cost:.4f}\n'
+            f'     🚫 SL: {position.stop_loss:.4f}\t\t 🤝 TP: {position.take_profit:.4f}\n'
+            f'     📈 RSI: {position.entry_RSI:.2f}\t\t 🎛  Macro-RSI: {position.entry_macro_RSI:.2f}\n'
+            f'     🧭 Tactic: {position.entry_trigger}\n'
+        )
 
     total = account.available + account.allocated
 
@@ -315,6 +580,46 @@ def open_new_positions(strategy, opened_positions):
         )
 
 
+def create_session(prefix, strategies_path='strategies.json', archive='gzip'):
+    """Create the prefix's next session directory, copy the strategies into it, and move there."""
+    last_index = -1
+
+    Path('sessions/').mkdir(exist_ok=True)
+
+    for session in listdir('sessions/'):
+        head, _, index = session.rpartition('_')
+
+        if head == prefix and index.isdigit():
+            # Existing session found: get the last index and increment
+            last_index = max(last_index, int(index))
+
+    session = f'{prefix}_{last_index+1}'
+    full_path = 'sessions/' + session
+
+    # Create session directory and initialise files.
+    Path(full_path).mkdir(parents=True, exist_ok=True)
+    copyfile(strategies_path, full_path + '/strategies.json')
+    chdir(full_path)
+
+    telemetry.start(archive)
+
+    return full_path
+
+
+def resume_session(session, archive='gzip'):
+    """Move to an existing session directory to resume it from its snapshot."""
+    full_path = 'sessions/' + session
+
+    if not Path(full_path, snapshot.SNAPSHOT_PATH).exists():
+        raise FileNotFoundError(f'No snapshot to resume in {full_path}')
+
+    chdir(full_path)
+
+    telemetry.start(archive)
+
+    return full_path
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='_> init Delfos')
 
@@ -323,30 +628,38 @@ if __name__ == '__main__':
         '--reset', action=argparse.BooleanOptionalAction,
         help='reset leverage and margin mode on startup'
     )
+    parser.add_argument(
+        '--stream', action='store_true',
+        help='update candles from WebSocket kline streams instead of polling'
+    )
+    parser.add_argument(
+        '--archive', choices=['gzip', 'parquet', 'none'], default='gzip',
+        help='format of rotated telemetry CSVs (parquet needs pyarrow)'
+    )
+    parser.add_argument(
+        '--metrics-port', type=int, metavar='PORT',
+        help='serve Prometheus metrics at http://127.0.0.1:PORT/metrics (instrumentation is off otherwise)'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=0, metavar='N',
+        help='trade the paper strategies in N processes, sharing the market data of this one'
+    )
+    parser.add_argument(
+        '--resume', metavar='SESSION',
+        help='resume a session (e.g. ID_2021-09-01_0) from its snapshot instead of starting a new one'
+    )
     args = parser.parse_args()
 
-    last_index = -1
-    prefix = f'{args.id}_{datetime.now():%Y-%m-%d}'
+    archive = None if args.archive == 'none' else args.archive
 
-    for session in listdir('sessions/'):
-        if session.startswith(prefix):
-            # Existing day-session found: get the last index and increment
-            last_dash = session.find('_', len(args.id) + 1)
-            index = int(session[last_dash+1:])
-            if index > last_index:
-                last_index = index
+    if args.resume:
+        prefix = args.resume.rpartition('_')[0]
+        full_path = resume_session(args.resume, archive)
+    else:
+        prefix = f'{args.id}_{datetime.now():%Y-%m-%d}'
+        full_path = create_session(prefix, archive=archive)
 
-    session = f'{prefix}_{last_index+1}'
-    full_path = 'sessions/' + session
-
-    # Create session directory and initialise files.
-    Path(full_path).mkdir(parents=True, exist_ok=True)
-    copyfile('strategies.json', full_path + '/strategies.json')
-    chdir(full_path)
-
-    with open('price-history.csv', 'w') as fd1, open('macro-history.csv', 'w') as fd2:
-        fd1.write('symbol,price,RSI,timestamp\n')
-        fd2.write('macro_RSI,timestamp\n')
+    snapshot.open_snapshot()
 
     # Use `debug()` for writing to STDOUT but NOT to logfile.
     logger.remove()
@@ -360,4 +673,8 @@ if __name__ == '__main__':
     logger.info('Logging at: ' + full_path)
     logger.info(f'INTERVAL: {INTERVAL}')
 
+    if args.metrics_port:
+        metrics.collectors.extend([retry.samples, weight.samples])
+        metrics.start(args.metrics_port)
+
     main()
@@ -1,27 +1,41 @@
 import json
 import math
+import time
 
 import ccxt
+from loguru import logger
+
+from models.PositionBook import PositionBook
+from utils.files import write_atomically
+import utils.metrics as metrics
+import utils.retry as retry
+
+SNAPSHOT_INTERVAL = 1.0  # minimum seconds between rewrites of opened.json
 
 
 class Account:
     def __init__(self, initial_size):
         self.INITIAL_SIZE = initial_size  # constant
         self.strategy = None  # Strategy object associated with the account
+        self.ledger = None    # Ledger where closed positions are appended
+        self.stream = None    # UserStream pushing fills and balances of REAL accounts
 
         self.allocated = 0.0  # capital allocated in positions (USDT)
         self.available = initial_size  # free capital + realized pnl - fees
         self.free_trading_slots = None
 
-        # Arrays storing Position objects
-        self.positions = []  # currently open positions
-        self.potential = []  # positions to be opened
+        self.positions = PositionBook()  # currently open positions
+        self.potential = []  # pairs to open positions for
 
         self.fees = 0.0  # total trading fees incurred by the account
         self.pnl = 0.0   # total realized and recompounded net profit & loss in USDT
         self.loses = 0   # counter of unprofitable trades
         self.wins = 0    # counter of profitable trades
 
+        self.revision = 0         # incremented whenever the open positions change
+        self.logged_revision = 0  # revision last dumped to opened.json
+        self.logged_at = 0.0      # UNIX time of the last dump
+
     def __eq__(self, other):
         return self.strategy == other.strategy \
             and self.allocated == other.allocated \
@@ -46,17 +60,33 @@ class Account:
             f'\twins, loses  = {self.wins}, {self.loses}\n'
 
     def fetch_real_balance(self):
-        """Fetch account data from exchange."""
+        """Fetch account data from exchange. Keep the last known balance if it cannot be fetched."""
+        # Balances are pushed by the user-data stream while connected (see `update_balance`)
+        if self.stream is not None and self.stream.connected.is_set():
+            return
+
         try:
-            balance = self.strategy.exchange.fetch_balance()['USDT']
-            self.allocated = balance['used']
-            self.available = balance['free']
-        except ccxt.NetworkError:
-            self.fetch_real_balance()   # If failed, try again until success
+            balance = retry.call('fetch_balance', self.strategy.exchange.fetch_balance)['USDT']
+        except ccxt.NetworkError as e:
+            logger.error(f'NetworkError: failed fetching balance, keeping the last one ({e})')
+            return
+
+        self.allocated = balance['used']
+        self.available = balance['free']
+
+    def update_balance(self, allocated, available):
+        """Set the balance pushed by the user-data stream."""
+        self.allocated, self.available = allocated, available
+
+        self.free_trading_slots = math.floor(
+            self.available * self.strategy.STOP_LOSS * self.strategy.RISK * 100
+        )
 
+    @metrics.timed('account', method='log_new_position')
     def log_new_position(self, position):
-        """Add the position to its array and update the appropriate counters."""
-        self.positions.append(position)
+        """Add the position to the book and update the appropriate counters."""
+        self.positions.add(position)
+        self.revision += 1
 
         if self.strategy.REAL:
             self.fetch_real_balance()
@@ -68,12 +98,16 @@ class Account:
             self.available * self.strategy.STOP_LOSS * self.strategy.RISK * 100
         )
 
+    @metrics.timed('account', method='log_closed_position')
     def log_closed_position(self, position):
-        """Remove the position from its array and update the appropriate counters."""
+        """Remove the position from the book and update the appropriate counters."""
         self.positions.remove(position)
+        self.revision += 1
 
-        # A win is only such if the position's net P&L is positive
-        if position.net_pnl >= 0:
+        # A win is only such if the position's net P&L is positive (unknown P&Ls are not counted)
+        if position.net_pnl is None:
+            pass
+        elif position.net_pnl >= 0:
             self.wins += 1
         else:
             self.loses += 1
@@ -85,25 +119,31 @@ class Account:
             self.available += position.cost + position.net_pnl  # Recompound magic, baby
 
         self.fees += position.fee
-        self.pnl += position.net_pnl
+        self.pnl += position.net_pnl or 0.0
 
         self.free_trading_slots = math.floor(
             self.available * self.strategy.STOP_LOSS * self.strategy.RISK * 100
         )
 
-        # Append the last closed position to closed.json.
-        with open(self.strategy.name + '__closed.json', 'r+') as fd:
-            data = fd.read()
-            closed = json.loads(data) + [position.__dict__]
-            fd.seek(0)
-            fd.write(json.dumps(closed, indent=4, default=str) + '\n')
-            fd.truncate()
+        # Append the last closed position to closed.jsonl
+        self.ledger.append(position.__dict__)
+
+    @metrics.timed('account', method='log_open_positions')
+    def log_open_positions(self, force=False):
+        """Dump open positions to opened.json if they changed, at most every SNAPSHOT_INTERVAL."""
+        if self.revision == self.logged_revision:
+            return
+
+        # Still dirty when throttled, so a later call will write it
+        if not force and time.time() - self.logged_at < SNAPSHOT_INTERVAL:
+            return
 
-    def log_open_positions(self):
-        """Dump open positions to opened.json."""
         raw_positions = []
         for pos in self.positions:
             raw_positions.append(pos.__dict__)
 
-        with open(self.strategy.name + '__opened.json', 'w') as fd:
-            fd.write(json.dumps(raw_positions, indent=4, default=str) + '\n')
+        write_atomically(
+            self.strategy.name + '__opened.json', json.dumps(raw_positions, indent=4, default=str) + '\n'
+        )
+
+        self.logged_revision, self.logged_at = self.revision, time.time()
@@ -0,0 +1,35 @@
+from models.Pair import Pair
+
+
+class Market:
+    def __init__(self, symbols, prices, RSIs, candles=None):
+        """Snapshot of all symbols' prices and RSIs, iterable as per-symbol Pair views."""
+        self.symbols = symbols
+        self.index = {symbol: i for i, symbol in enumerate(symbols)}
+
+        self.candles = candles  # (n_symbols, lookback) chronological; last column is forming
+        self.closes = candles['close'] if candles is not None else None
+        self.prices = prices    # current price of each symbol
+        self.RSIs = RSIs        # current RSI of each symbol
+
+        self.pairs = [None] * len(symbols)  # Pair views, created on first access
+
+    def __str__(self):
+        lookback = self.closes.shape[1] if self.closes is not None else 0
+        return f'Market({len(self.symbols)} symbols, lookback={lookback})'
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __getitem__(self, i):
+        if self.pairs[i] is None:
+            self.pairs[i] = Pair(self.symbols[i], self.prices[i], self.RSIs[i])
+
+        return self.pairs[i]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self.symbols)))
+
+    def pair(self, symbol):
+        """Return the Pair view of the given symbol."""
+        return self[self.index[symbol]]
@@ -1,7 +1,8 @@
-from datetime import datetime
-
 from loguru import logger
 
+import utils.clock as clock
+import utils.retry as retry
+
 
 class Position:
     def __init__(self, pair, cost, strategy, macro_RSI):
@@ -15,7 +16,7 @@ class Position:
         if strategy.REAL:
             self.create_orders(pair, cost, strategy)
         else:
-            self.opened_at = datetime.now()
+            self.opened_at = clock.now()
             self.entry_price = pair.price
             self.cost = cost
             self.size = cost / pair.price
@@ -56,13 +57,18 @@ class Position:
 
     def create_orders(self, pair, cost, strategy):
         tentative_size = cost / pair.price  # base currency (COIN)
-        order = strategy.exchange.create_order(
-            pair.symbol, 'MARKET', pair.side, tentative_size
+        order = retry.call('create_order', strategy.exchange.create_order,
+            pair.symbol, 'MARKET', pair.side, tentative_size, attempts=1
         )
 
         logger.info(order)
 
-        self.opened_at = datetime.now()
+        # NOTE: the order may be acknowledged before it fills; the fill sizes SL/TP
+        if not order['filled'] or order['price'] is None:
+            order = retry.call('fetch_order', strategy.exchange.fetch_order, order['id'], pair.symbol)
+            logger.info(order)
+
+        self.opened_at = clock.now()
         self.entry_price = order['price']  # quote currency (USDT)
         self.cost = order['cost']    # quote currency
         self.size = order['filled']  # base currency
@@ -71,19 +77,58 @@ class Position:
         inverted_side = 'sell' if pair.side == 'buy' else 'buy'
 
         # Create orders with the returned base size
-        sl_order = strategy.exchange.create_order(
-            self.symbol, 'STOP_MARKET', inverted_side, self.size, None, {'stopPrice': self.stop_loss}
+        self.create_exit_orders(strategy.exchange, inverted_side)
+
+    def create_exit_orders(self, exchange, inverted_side):
+        """Create the SL and TP orders with a single batch request (weight = 5)."""
+        market = exchange.market(self.symbol)
+        legs = [('STOP_MARKET', self.stop_loss), ('TAKE_PROFIT_MARKET', self.take_profit)]
+
+        batch = exchange.json([{
+            'symbol': market['id'],
+            'side': inverted_side.upper(),
+            'type': order_type,
+            'quantity': exchange.amount_to_precision(self.symbol, self.size),
+            'stopPrice': exchange.price_to_precision(self.symbol, stop_price),
+        } for order_type, stop_price in legs])
+
+        responses = retry.call(
+            'batch_orders', exchange.fapiPrivate_post_batchorders, {'batchOrders': batch}, attempts=1
         )
-        self.sl_id, self.stop_loss = sl_order['id'], sl_order['stopPrice']
 
-        logger.info(sl_order)
+        orders = []
+        for (order_type, stop_price), response in zip(legs, responses):
+            logger.info(response)
 
-        tp_order = strategy.exchange.create_order(
-            self.symbol, 'TAKE_PROFIT_MARKET', inverted_side, self.size, None, {'stopPrice': self.take_profit}
-        )
-        self.tp_id, self.take_profit = tp_order['id'], tp_order['stopPrice']
+            if 'orderId' in response:
+                orders.append((str(response['orderId']), float(response['stopPrice'])))
+                continue
+
+            # NOTE: a rejected leg does not fail the other one; retry it on its own
+            logger.error(f'Batch {order_type} failed for {self.symbol}: {response}, retrying alone...')
+            order = retry.call('create_order', exchange.create_order,
+                self.symbol, order_type, inverted_side, self.size, None, {'stopPrice': stop_price}, attempts=1
+            )
+            logger.info(order)
+
+            orders.append((order['id'], order['stopPrice']))
+
+        (self.sl_id, self.stop_loss), (self.tp_id, self.take_profit) = orders
+
+    def fetch_exit_price(self, exchange):
+        """Return the average price of the trades closing the position since it opened, or None."""
+        since = int(self.opened_at.timestamp() * 1000)
+        trades = retry.call('fetch_my_trades', exchange.fetch_my_trades, self.symbol, since)
+
+        inverted_side = 'sell' if self.side == 'buy' else 'buy'
+        closing = [trade for trade in trades if trade['side'] == inverted_side]
+        amount = sum(trade['amount'] for trade in closing)
 
-        logger.info(tp_order)
+        if not amount:
+            logger.error(f'No trade closed {self.symbol} {self.side}: exit price unknown')
+            return None
+
+        return sum(trade['price'] * trade['amount'] for trade in closing) / amount
 
     def set_SL_and_TP(self, strategy):
         """Calculates and sets stop loss and take profit prices."""
@@ -98,27 +143,43 @@ class Position:
         """Mark the position as closed at the given exit_price and calculate P&L and fees."""
         if strategy.REAL:
             # Close all symbol orders (i.e. TP & SL) with a single call (weight = 1)
-            strategy.exchange.fapiPrivate_delete_allopenorders({
+            retry.call('cancel_all_orders', strategy.exchange.fapiPrivate_delete_allopenorders, {
                 'symbol': self.symbol.replace('/', '')
             })
 
+            stream = strategy.account.stream
+            fill = None
+
+            # Closed outside of the bot meanwhile (e.g. by hand or liquidated): there is nothing to close
+            if trigger == 'external':
+                logger.warning(f'{self.symbol} {self.side} was closed on exchange, not by its SL/TP')
+                self.exit_price = self.fetch_exit_price(strategy.exchange)
+
+                if self.exit_price is not None:
+                    self.fee += self.size * self.exit_price * 0.00036
             # Order may have already been closed by exchange due to SL/TP hit
-            if trigger == 'SL' or trigger == 'TP':
+            elif trigger == 'SL' or trigger == 'TP':
                 logger.info(f'{trigger} hit, dumping order...')
+                order_id = self.sl_id if trigger == 'SL' else self.tp_id
 
-                # Retrieve SL/TP order to log exit price precisely (weight = 1)
-                order = strategy.exchange.fetch_order(
-                    self.sl_id if trigger == 'SL' else self.tp_id,
-                    self.symbol
-                )
+                # The user-data stream already pushed the exact fill (if connected at the time)
+                if stream is not None:
+                    fill = stream.fill(order_id)
+
+                if fill is not None and fill.status == 'FILLED':
+                    logger.info(fill)
+                    order = None
+                else:
+                    # Retrieve SL/TP order to log exit price precisely (weight = 1)
+                    order = retry.call('fetch_order', strategy.exchange.fetch_order, order_id, self.symbol)
 
                 # Do not assume order['status'] == 'filled'
-                if order['amount'] != order['filled']:
+                if order is not None and order['amount'] != order['filled']:
                     logger.critical('Order did NOT FILL, trying to close manually...')
 
                     inverted_side = 'sell' if self.side == 'buy' else 'buy'
-                    order = strategy.exchange.create_order(
-                        self.symbol, 'MARKET', inverted_side, self.size
+                    order = retry.call('create_order', strategy.exchange.create_order,
+                        self.symbol, 'MARKET', inverted_side, self.size, attempts=1
                     )
             # SL/TP haven't been hit: create market order for closing position
             else:
@@ -126,20 +187,40 @@ class Position:
                 inverted_side = 'sell' if self.side == 'buy' else 'buy'
 
                 # Close the order manually (weight = 1)
-                order = strategy.exchange.create_order(
-                    self.symbol, 'MARKET', inverted_side, self.size
+                order = retry.call('create_order', strategy.exchange.create_order,
+                    self.symbol, 'MARKET', inverted_side, self.size, attempts=1
                 )
 
-            logger.info(order)
+            if trigger == 'external':
+                pass
+            elif order is None:
+                self.exit_price = fill.price
+
+                if fill.commission is not None:
+                    self.fee += fill.commission  # exact, as charged by Binance
+                else:
+                    self.fee += self.size * fill.price * 0.00036
+            else:
+                logger.info(order)
 
-            self.exit_price = order['price']
-            self.fee += order['cost'] * 0.00036  # the cost has the raw P&L included
+                # Market closes usually get their fill streamed before the response arrives
+                fill = stream.fill(order['id']) if stream is not None else None
+
+                self.exit_price = order['price']
+                if fill is not None and fill.status == 'FILLED' and fill.commission is not None:
+                    self.fee += fill.commission
+                else:
+                    self.fee += order['cost'] * 0.00036  # the cost has the raw P&L included
         else:
             self.exit_price = pair.price
 
-        self.closed_at = datetime.now()
+        self.closed_at = clock.now()
         self.exit_macro_RSI, self.exit_RSI = macro_RSI, pair.RSI
 
+        # Unknown exit price: P&L stays unknown (None) too
+        if self.exit_price is None:
+            return
+
         if self.side == 'buy':
             self.pnl = (self.exit_price - self.entry_price) / self.entry_price
         else:
@@ -0,0 +1,93 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)  # naive, like the clock's datetimes
+MICROSECOND = timedelta(microseconds=1)
+
+# Exit parameters of all open positions, as columns
+PositionArrays = namedtuple('PositionArrays', [
+    'positions', 'symbols', 'entry_prices', 'stop_losses', 'take_profits', 'buys', 'trends', 'opened_at',
+])
+
+
+def to_microseconds(moment):
+    """Return the exact microseconds since the epoch of a naive datetime."""
+    return (moment - EPOCH) // MICROSECOND
+
+
+class PositionBook:
+    def __init__(self):
+        """Open positions of an account (at most one per symbol), indexed for O(1) lookups."""
+        self.by_symbol = {}  # symbol -> Position
+        self.by_side = {'buy': {}, 'sell': {}}               # side -> symbol -> Position
+        self.by_tactic = {'trend': {}, 'reversal': {}}       # entry tactic -> symbol -> Position
+
+        self.columns = None  # PositionArrays, rebuilt after positions are added or removed
+
+    def __eq__(self, other):
+        return self.by_symbol == other.by_symbol
+
+    def __str__(self):
+        return f'PositionBook({len(self)} positions: ' \
+            f'{len(self.by_side["buy"])} buy, {len(self.by_side["sell"])} sell)'
+
+    def __contains__(self, symbol):
+        return symbol in self.by_symbol
+
+    def __getitem__(self, symbol):
+        return self.by_symbol[symbol]
+
+    def __iter__(self):
+        return iter(list(self.by_symbol.values()))  # copy: positions may be removed while iterating
+
+    def __len__(self):
+        return len(self.by_symbol)
+
+    def get(self, symbol):
+        """Return the position opened for the symbol, or None."""
+        return self.by_symbol.get(symbol)
+
+    def add(self, position):
+        """Index a newly opened position."""
+        if position.symbol in self.by_symbol:
+            raise ValueError(f'A position for {position.symbol} is already open')
+
+        self.by_symbol[position.symbol] = position
+        self.by_side[position.side][position.symbol] = position
+        self.by_tactic.setdefault(position.entry_trigger, {})[position.symbol] = position
+        self.columns = None
+
+    def remove(self, position):
+        """Drop a closed position from every index."""
+        del self.by_symbol[position.symbol]
+        del self.by_side[position.side][position.symbol]
+        del self.by_tactic[position.entry_trigger][position.symbol]
+        self.columns = None
+
+    def side(self, side):
+        """Return the open positions of the given side ('buy', 'sell')."""
+        return list(self.by_side[side].values())
+
+    def tactic(self, tactic):
+        """Return the open positions opened with the given tactic ('trend', 'reversal')."""
+        return list(self.by_tactic.get(tactic, {}).values())
+
+    def arrays(self):
+        """Return the exit parameters of all open positions as arrays (cached until they change)."""
+        if self.columns is None:
+            positions = list(self.by_symbol.values())
+
+            self.columns = PositionArrays(
+                positions,
+                [position.symbol for position in positions],
+                np.array([position.entry_price for position in positions], dtype=np.float64),
+                np.array([position.stop_loss for position in positions], dtype=np.float64),
+                np.array([position.take_profit for position in positions], dtype=np.float64),
+                np.array([position.side == 'buy' for position in positions], dtype=bool),
+                np.array([position.entry_trigger == 'trend' for position in positions], dtype=bool),
+                np.array([to_microseconds(position.opened_at) for position in positions], dtype=np.int64),
+            )
+
+        return self.columns
@@ -1,10 +1,22 @@
-from datetime import datetime
+import numpy as np
+
+import utils.clock as clock
+from utils.constants import INTERVAL
+import utils.metrics as metrics
+from models.PositionBook import to_microseconds
+
+# Exit triggers by code, as returned by `should_close_all` (0: keep the position open)
+TRIGGERS = (None, 'trend-tactic', 'macro-opposed', 'reversal-tactic', 'SL', 'TP', 'timer')
 
 
 class Strategy:
     def __init__(self, account, defaults, strategy):
         parameters = strategy.keys()
 
+        self.INTERVAL = strategy['interval'] \
+            if 'interval' in parameters \
+            else defaults.get('interval', INTERVAL)
+
         self.MODE = strategy['mode'] \
             if 'mode' in parameters \
             else defaults['mode']
@@ -48,6 +60,7 @@ class Strategy:
             f'SL-{(self.STOP_LOSS*100):g}_TP-{(self.TAKE_PROFIT*100):g}' \
             f'_{self.TIMER_TRIGGER}'
         self.name += '_profit' if self.PROFIT_CLOSE else ''
+        self.name += f'_{self.INTERVAL}' if self.INTERVAL != INTERVAL else ''
 
         if self.REAL:
             self.name += '_REAL'
@@ -58,7 +71,8 @@ class Strategy:
 
     def __eq__(self, other):
         # NOTE: `self.account` is not compared on purpose
-        return self.MODE == other.MODE \
+        return self.INTERVAL == other.INTERVAL \
+            and self.MODE == other.MODE \
             and self.OPEN_RSI_MIN == other.OPEN_RSI_MIN \
             and self.OPEN_RSI_MAX == other.OPEN_RSI_MAX \
             and self.CLOSE_RSI_MIN == other.CLOSE_RSI_MIN \
@@ -75,6 +89,7 @@ class Strategy:
 
     def __str__(self):
         return self.name + '\n' \
+            f'\tINTERVAL      = {self.INTERVAL}\n' \
             f'\tMODE          = {self.MODE}\n' \
             f'\tOPEN_RSI_MIN  = {self.OPEN_RSI_MIN}\n' \
             f'\tOPEN_RSI_MAX  = {self.OPEN_RSI_MAX}\n' \
@@ -137,8 +152,44 @@ class Strategy:
                 return True, 'TP'
 
         # Calculate the position's duration in minutes
-        position_duration = (datetime.now() - position.opened_at).seconds / 60
+        position_duration = (clock.now() - position.opened_at).seconds / 60
         if position_duration >= self.TIMER_TRIGGER:
             return True, 'timer'
 
         return False, None
+
+    @metrics.timed('should_close')
+    def should_close_all(self, positions, prices, RSIs, macro_RSI, now):
+        """
+        Batch `should_close` over a PositionArrays, given each position's current price and RSI.
+
+        Return the close mask and trigger codes (indices of TRIGGERS) of every position.
+        """
+        buys, sells = positions.buys, ~positions.buys
+        codes = np.zeros(len(buys), dtype=np.int8)
+
+        def hit(mask, trigger):
+            # Earlier triggers take precedence, as in `should_close`'s early returns
+            codes[(codes == 0) & mask] = TRIGGERS.index(trigger)
+
+        # Trend positions close as soon as the macro trend fades
+        trending = positions.trends & np.where(buys, macro_RSI < self.MACRO_RSI_MAX, macro_RSI > self.MACRO_RSI_MIN)
+        hit(trending, 'trend-tactic')
+
+        reversing = ~trending
+        hit(reversing & np.where(buys, macro_RSI <= self.MACRO_RSI_MIN, macro_RSI >= self.MACRO_RSI_MAX),
+            'macro-opposed')
+
+        completed = np.where(buys, RSIs >= self.CLOSE_RSI_MAX, RSIs <= self.CLOSE_RSI_MIN)
+        if self.PROFIT_CLOSE:
+            completed &= np.where(buys, prices >= positions.entry_prices, prices <= positions.entry_prices)
+        hit(reversing & completed, 'reversal-tactic')
+
+        hit((buys & (prices <= positions.stop_losses)) | (sells & (prices >= positions.stop_losses)), 'SL')
+        hit((buys & (prices >= positions.take_profits)) | (sells & (prices <= positions.take_profits)), 'TP')
+
+        # Duration's `timedelta.seconds` (i.e. ignoring whole days) in minutes
+        seconds = (to_microseconds(now) - positions.opened_at) // 1_000_000 % 86_400
+        hit(seconds / 60 >= self.TIMER_TRIGGER, 'timer')
+
+        return codes > 0, codes
@@ -1,40 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import ccxt
 from loguru import logger
 
 from utils.constants import BINANCE_APIKEY, BINANCE_SECRETKEY, LEVERAGE
+import utils.binance as binance
+import utils.markets as markets
+import utils.metrics as metrics
+import utils.retry as retry
+import utils.weight as weight
+
+MAX_WORKERS = binance.MAX_CONNECTIONS  # concurrent leverage/margin changes
+
+# Request weight of the private/public endpoints used through ccxt (others weigh 1)
+ENDPOINT_WEIGHTS = {'balance': 5, 'account': 5, 'positionRisk': 5, 'batchOrders': 5, 'income': 30}
+ORDER_ENDPOINTS = {'order', 'batchOrders', 'allOpenOrders'}
+
+
+class Exchange(ccxt.binanceusdm):
+    def fetch2(self, path, *args, **kwargs):
+        """Send every ccxt request through the weight scheduler; orders go first."""
+        priority = weight.ORDERS if path in ORDER_ENDPOINTS else weight.ACCOUNT
+        weight.acquire(ENDPOINT_WEIGHTS.get(path, 1), priority)
+
+        try:
+            with metrics.span('request', endpoint=path):
+                return super().fetch2(path, *args, **kwargs)
+        except (ccxt.DDoSProtection, ccxt.RateLimitExceeded):
+            weight.observe(self.last_response_headers or {}, 429)
+            raise
+        finally:
+            weight.observe(self.last_response_headers or {})
 
 
 class Trader:
     def __init__(self):
-        """Initialise CCXT object and load markets."""
-        self.exchange = ccxt.binanceusdm({
+        """Initialise CCXT object and load markets (from cache if possible)."""
+        self.exchange = Exchange({
             'apiKey': BINANCE_APIKEY,
             'secret': BINANCE_SECRETKEY,
             'enableRateLimit': True
         })
 
-        self.exchange.load_markets()
-        self.symbols = self.filter_symbols()
+        markets.load(self.exchange, self.is_traded)
+        self.symbols = list(self.exchange.markets)
 
-    def filter_symbols(self):
-        """Delete unwanted symbols from self.markets."""
-        markets = self.exchange.markets
+    @staticmethod
+    def is_traded(market):
+        """Return if the market is a traded USDT perpetual (i.e. not a quarterly contract)."""
+        info = market['info']
 
-        for symbol in list(markets):
-            info = markets[symbol]['info']
-            if info['quoteAsset'] != 'USDT' or \
-                info['contractType'] != 'PERPETUAL' or \
-                info['status'] != 'TRADING' or \
-                info['underlyingType'] != 'COIN':
-                # Skip non-USDT, non-perpetual, non-traded, and quarterlies contracts
-                del markets[symbol]
-                continue
+        return info['quoteAsset'] == 'USDT' and \
+            info['contractType'] == 'PERPETUAL' and \
+            info['status'] == 'TRADING' and \
+            info['underlyingType'] == 'COIN'
 
-        # return list(map(lambda x: x.replace('/',''), markets))
-        return list(markets)
-
-    def setup_real_account(self, account, reset):
-        """Reset margins if wanted, close open positions and set account balance."""
+    def setup_real_account(self, account, reset, resume=False):
+        """Reset margins if wanted, close open positions (unless resuming) and set account balance."""
         logger.warning(f'⚠️  Found REAL strategy')
 
         if reset:
@@ -44,55 +66,100 @@ class Trader:
             logger.debug('Setting all token\'s margin mode to ISOLATED...')
             self.set_margin_mode()
         elif reset is None:
-            logger.info(f'Reset leverage to x{LEVERAGE}? Takes about 1 minute (y/N) ', end='')
+            logger.info(f'Reset leverage to x{LEVERAGE}? (y/N) ', end='')
             answer = input()
             if answer == 'y' or answer == 'Y':
                 logger.debug(f'Setting all token\'s leverage to x{LEVERAGE}...')
                 self.set_leverage()
 
-            logger.info('Reset margin mode to ISOLATED? Takes about 1 minute (y/N) ', end='')
+            logger.info('Reset margin mode to ISOLATED? (y/N) ', end='')
             answer = input()
             if answer == 'y' or answer == 'Y':
                 logger.debug('Setting all token\'s margin mode to ISOLATED...')
                 self.set_margin_mode()
 
+        # Resumed positions are reconciled once all accounts are restored (see `reconcile_positions`)
+        if resume:
+            account.fetch_real_balance()
+            return
+
         # NOTE: `close_all_positions` does not ensure no positions are left open
         logger.debug('Fetching and closing open positions before launching...')
         self.close_all_positions()
 
         # Overwrite default balance with actual capital on exchange
-        free_balance = self.exchange.fetch_balance()['USDT']['free']
+        free_balance = retry.call('fetch_balance', self.exchange.fetch_balance)['USDT']['free']
         account.available, account.INITIAL_SIZE = free_balance, free_balance
 
     def set_leverage(self):
-        """Set all token's leverage to `LEVERAGE` on Binance."""
-        for symbol in self.symbols:
-            logger.debug(symbol[:-5])
-            alt_symbol = symbol.replace('/', '')
+        """Set all token's leverage to `LEVERAGE` (or their maximum) on Binance, where it differs."""
+        settings = self.fetch_settings()
+
+        # Leverage brackets of all symbols in a single request (weight = 1)
+        brackets = retry.call('leverage_bracket', self.exchange.fapiPrivate_get_leveragebracket)
+        max_leverages = {
+            bracket['symbol']: max(int(b['initialLeverage']) for b in bracket['brackets'])
+            for bracket in brackets
+        }
+
+        changes = []
+        for alt_symbol in settings:
+            leverage = min(LEVERAGE, max_leverages.get(alt_symbol, LEVERAGE))
+
+            if int(settings[alt_symbol]['leverage']) != leverage:
+                changes.append((alt_symbol, leverage))
+
+        logger.debug(f'Changing the leverage of {len(changes)}/{len(settings)} symbols...')
+
+        def change(alt_symbol, leverage):
+            retry.call('leverage', self.exchange.fapiPrivate_post_leverage, {
+                'symbol': alt_symbol, 'leverage': leverage
+            })
+            logger.info(f'Leverage set to x{leverage} for {alt_symbol}')
+
+        self.apply(change, changes)
 
-            self.exchange.fapiPrivate_post_leverage({'symbol': alt_symbol, 'leverage': LEVERAGE})
-    
     def set_margin_mode(self):
-        """Set  all token's margin mode to ISOLATED on Binance."""
-        for symbol in self.symbols:
-            logger.debug(symbol[:-5])
-            alt_symbol = symbol.replace('/', '')
+        """Set all token's margin mode to ISOLATED on Binance, where it differs."""
+        settings = self.fetch_settings()
+        changes = [
+            (alt_symbol,) for alt_symbol, setting in settings.items() if setting['marginType'] != 'isolated'
+        ]
 
+        logger.debug(f'Changing the margin mode of {len(changes)}/{len(settings)} symbols...')
+
+        def change(alt_symbol):
             try:
-                self.exchange.fapiPrivate_post_margintype({
+                retry.call('margin_type', self.exchange.fapiPrivate_post_margintype, {
                     'symbol': alt_symbol, 'marginType': 'ISOLATED'
                 })
+            # NOTE: fails on symbols with open positions or orders
             except ccxt.ExchangeError as e:
                 logger.debug(e)
-                continue
             else:
-                logger.info('Margin mode adjusted for ' + symbol)
+                logger.info('Margin mode adjusted for ' + alt_symbol)
+
+        self.apply(change, changes)
 
-    def close_all_positions(self):
-        """Close all open positions on exchange with market order."""
-        open_positions = list(filter(
-            lambda p: p['contracts'] != 0, self.exchange.fetchPositions()
-        ))
+    def fetch_settings(self):
+        """Return the current leverage and margin type of all traded symbols (weight = 5)."""
+        ids = {symbol.replace('/', '') for symbol in self.symbols}
+        risks = retry.call('position_risk', self.exchange.fapiPrivateV2_get_positionrisk)
+
+        # NOTE: hedge mode returns one entry per side, with the same settings
+        return {risk['symbol']: risk for risk in risks if risk['symbol'] in ids}
+
+    def apply(self, change, changes):
+        """Apply the changes concurrently; the weight scheduler keeps them within the rate limit."""
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for future in [executor.submit(change, *arguments) for arguments in changes]:
+                future.result()
+
+    def close_all_positions(self, keep=()):
+        """Close all open positions on exchange with market order, except those of the `keep` symbols."""
+        open_positions = [
+            position for position in self.fetch_open_positions() if position['symbol'] not in keep
+        ]
 
         logger.debug(f'Found {len(open_positions)} open positions')
 
@@ -106,11 +173,52 @@ class Trader:
                 logger.info(position)
 
                 # Close the existing order
-                logger.info(
-                    self.exchange.create_order(symbol, 'MARKET', inverted_side, size)
-                )
+                logger.info(retry.call('create_order', self.exchange.create_order,
+                    symbol, 'MARKET', inverted_side, size, attempts=1
+                ))
 
                 # Cancel the corresponding SL & TP orders
-                self.exchange.fapiPrivate_delete_allopenorders(
+                retry.call('cancel_all_orders', self.exchange.fapiPrivate_delete_allopenorders,
                     {'symbol': symbol.replace('/', '')}
                 )
+
+    def fetch_open_positions(self):
+        """Return the positions open on exchange (weight = 5)."""
+        return [
+            position for position in retry.call('fetch_positions', self.exchange.fetchPositions)
+            if position['contracts'] != 0
+        ]
+
+    def reconcile_positions(self, accounts):
+        """
+        Match the positions restored in REAL accounts with those open on exchange.
+
+        Close exchange positions no account knows of. Return the restored (account, position, trigger)
+        closed on exchange meanwhile, for the caller to log: by their SL or TP order if either filled,
+        else 'external' (e.g. closed by hand or liquidated), which must not send any order.
+        """
+        symbols = {position['symbol'] for position in self.fetch_open_positions()}
+        restored = {position.symbol for account in accounts for position in account.positions}
+
+        self.close_all_positions(keep=restored)
+
+        closed = []
+        for account in accounts:
+            for position in account.positions:
+                if position.symbol in symbols:
+                    continue
+
+                trigger = 'external'
+
+                for exit_trigger, order_id in (('SL', position.sl_id), ('TP', position.tp_id)):
+                    order = retry.call('fetch_order', self.exchange.fetch_order, order_id, position.symbol)
+
+                    if order['status'] == 'closed':  # i.e. filled
+                        trigger = exit_trigger
+                        break
+
+                closed.append((account, position, trigger))
+
+        logger.info(f'Resumed {len(restored) - len(closed)} open positions ({len(closed)} closed meanwhile)')
+
+        return closed
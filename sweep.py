@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from loguru import logger
+
+from backtest import backtest
+import main
+from utils.history import load_history, load_RSIs
+from utils.indicators import RSI_PERIOD
+import utils.ledger as ledger
+import utils.telemetry as telemetry
+
+# Market data shared by all the configurations evaluated in a worker process (memory-mapped)
+symbols, times, closes, RSIs = None, None, None, None
+
+
+def expand_grid(grid):
+    """Expand parameter ranges into every combination of raw strategies.
+
+    Values are either lists or `{"start", "stop", "step"}` ranges (stop excluded), e.g.
+    `{"stop_loss": {"start": 0.01, "stop": 0.05, "step": 0.005}, "open_RSIs": [[30, 70], [25, 75]]}`.
+    """
+    values = []
+    for value in grid.values():
+        if isinstance(value, dict):
+            value = np.arange(value['start'], value['stop'], value['step']).round(10).tolist()
+
+        values.append(value)
+
+    return [dict(zip(grid.keys(), combination)) for combination in itertools.product(*values)]
+
+
+def init_worker(data, scratch):
+    """Map the shared klines and RSIs into the worker and move it to a scratch directory."""
+    global symbols, times, closes, RSIs
+
+    logger.remove()  # only the supervisor logs
+    telemetry.sinks.clear()  # writer threads are not inherited
+
+    symbols, times, closes = load_history(data, mmap=True)
+    RSIs = load_RSIs(data, RSI_PERIOD, mmap=True)
+
+    os.chdir(tempfile.mkdtemp(dir=scratch))
+
+
+def evaluate(defaults, raw_strategy):
+    """Backtest a single configuration. Return its parameters and performance."""
+    account, strategy = main.create_strategy(defaults, {**raw_strategy, 'REAL': False})
+    main.strategies, main.accounts = [strategy], [account]
+
+    backtest(symbols, times, closes, RSIs)
+
+    account.ledger.close()
+    closed = list(ledger.read(account.ledger.path))
+
+    # Realized equity after each closed position
+    equity = account.INITIAL_SIZE + np.cumsum([position['net_pnl'] for position in closed])
+    peaks = np.maximum.accumulate(np.concatenate(([account.INITIAL_SIZE], equity)))[1:]
+    drawdown = float(((peaks - equity) / peaks).max()) if closed else 0.0
+
+    # Clean the scratch directory for the next configuration
+    for path in os.listdir():
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    trades = account.wins + account.loses
+
+    return {
+        **raw_strategy,
+        'pnl': account.pnl,
+        'trades': trades,
+        'win_rate': account.wins / trades if trades else 0.0,
+        'drawdown': drawdown,
+        'fees': account.fees,
+        'open': len(account.positions),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='_> sweep Delfos')
+
+    parser.add_argument('id', help='sweep ID')
+    parser.add_argument('data', help='directory with one kline CSV/Parquet file per symbol')
+    parser.add_argument('grid', help='JSON file with "defaults" and a "grid" of parameter ranges')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes (default: all cores)')
+    parser.add_argument('--top', type=int, default=10, help='configurations to log (default: 10)')
+    args = parser.parse_args()
+
+    with open(args.grid) as fd:
+        data = json.loads(fd.read())
+
+    configurations = expand_grid(data['grid'])
+
+    # Parse the klines and compute the RSIs once; workers memory-map the cached arrays
+    data_path = os.path.abspath(args.data)
+    load_history(data_path)
+    load_RSIs(data_path, RSI_PERIOD)
+
+    full_path = main.create_session(f'{args.id}_sweep', args.grid)
+
+    logger.remove()
+    logger.add(f'{args.id}_sweep_tracking.log', level='INFO',
+        format='{time:MM-DD HH:mm:ss.SSS} | {level} | {message}'
+    )
+    logger.add(sys.stderr, level='INFO', colorize=True, format=
+        '<green>{time:MM-DD HH:mm:ss.SSS}</green> | <level>{message}</level>'
+    )
+
+    logger.info('Logging at: ' + full_path)
+    logger.info(f'Evaluating {len(configurations)} configurations on {args.workers} workers...')
+
+    started_at = time.time()
+
+    with tempfile.TemporaryDirectory(prefix='delfos-sweep-') as scratch, \
+        ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(data_path, scratch)) as executor:
+        results = list(executor.map(
+            evaluate, itertools.repeat(data['defaults']), configurations,
+            chunksize=max(1, len(configurations) // (args.workers * 16))
+        ))
+
+    # Best P&L first; ties broken by win rate, then by the smallest drawdown
+    results.sort(key=lambda r: (-r['pnl'], -r['win_rate'], r['drawdown']))
+
+    telemetry.close()
+
+    with open('sweep.json', 'w') as fd:
+        fd.write(json.dumps(results, indent=4) + '\n')
+
+    logger.info(f'Evaluated {len(results)} configurations in {time.time() - started_at:.1f}s')
+
+    for rank, result in enumerate(results[:args.top], 1):
+        logger.info(
+            f'#{rank} P&L: ${result["pnl"]:.2f}, win rate: {result["win_rate"]*100:.1f}% '
+            f'({result["trades"]} trades), drawdown: {result["drawdown"]*100:.2f}% | '
+            + json.dumps({key: result[key] for key in data['grid']})
+        )
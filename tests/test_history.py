@@ -0,0 +1,38 @@
+import numpy as np
+
+from utils.history import align
+from utils.indicators import RSI_history
+
+MINUTE = 60_000
+
+
+def klines(start, closes):
+    """Return the (times, closes) of one-minute klines opened every minute from `start`."""
+    return (start + np.arange(len(closes)) * MINUTE).astype(np.int64), np.array(closes, dtype=np.float64)
+
+
+def test_align_fills_gaps_only_while_listed():
+    listed = klines(0, np.arange(1, 11))            # minutes 0-9
+    late = klines(3 * MINUTE, [5, 6, 7])            # listed at minute 3
+    delisted = klines(0, [1, 2, 3, 4])              # delisted after minute 3
+    gap = (np.array([0, 4 * MINUTE]), np.array([1.0, 2.0]))  # no candles in between
+
+    times, closes = align([listed, late, delisted, gap])
+
+    assert np.array_equal(times, np.arange(10) * MINUTE)
+    np.testing.assert_array_equal(closes[:, 1], [np.nan] * 3 + [5, 6, 7] + [np.nan] * 4)
+    np.testing.assert_array_equal(closes[:, 2], [1, 2, 3, 4] + [np.nan] * 6)
+    np.testing.assert_array_equal(closes[:, 3], [1, 1, 1, 1, 2] + [np.nan] * 5)
+
+
+def test_delisted_symbols_lose_their_RSI():
+    rng = np.random.default_rng(0)
+    listed = klines(0, 100 + rng.normal(0, 1, 100).cumsum())
+    delisted = klines(0, 100 + rng.normal(0, 1, 60).cumsum())
+
+    _, closes = align([listed, delisted])
+    RSIs = RSI_history(closes)
+
+    assert not np.isnan(RSIs[59, 1])
+    assert np.isnan(RSIs[60:, 1]).all()  # instead of frozen at its last value
+    assert not np.isnan(RSIs[20:, 0]).any()
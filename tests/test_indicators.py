@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from utils.indicators import RSI_PERIOD, TALIB_TOLERANCE, RSI_history, WilderRSI
+
+try:
+    import talib  # optional, the reference is checked against it when installed
+except ImportError:
+    talib = None
+
+WINDOW = 200  # candles per RSI window, as fetched live
+EXACT = 1e-9  # same recurrence, only float rounding differs
+
+
+def random_closes(n, seed=0):
+    rng = np.random.default_rng(seed)
+
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+def reference_RSI(closes, period=RSI_PERIOD):
+    """Return Wilder's RSI of every close, recomputed from scratch like talib.RSI (NaN during warm-up)."""
+    RSIs = [np.nan] * len(closes)
+    avg_gain = avg_loss = 0.0
+
+    for t in range(1, len(closes)):
+        change = closes[t] - closes[t - 1]
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+
+        if t <= period:
+            avg_gain, avg_loss = avg_gain + gain / period, avg_loss + loss / period
+        else:
+            avg_gain = (avg_gain * (period - 1) + gain) / period
+            avg_loss = (avg_loss * (period - 1) + loss) / period
+
+        if t >= period:
+            total = avg_gain + avg_loss
+            RSIs[t] = 100 * avg_gain / total if total else 0.0
+
+    return np.array(RSIs)
+
+
+@pytest.mark.skipif(talib is None, reason='talib is not installed')
+def test_reference_matches_talib():
+    closes = random_closes(1000)
+
+    np.testing.assert_allclose(reference_RSI(closes), talib.RSI(closes, RSI_PERIOD), atol=EXACT)
+
+
+def test_incremental_matches_reference():
+    closes = random_closes(1000)
+    expected = reference_RSI(closes)
+
+    state = WilderRSI()
+    state.seed(closes[:RSI_PERIOD + 1])
+    assert state.value() == pytest.approx(expected[RSI_PERIOD], abs=EXACT)
+
+    for t in range(RSI_PERIOD + 1, len(closes)):
+        # The forming candle's RSI is the one it gets once committed
+        assert state.peek(closes[t]) == pytest.approx(expected[t], abs=EXACT)
+        assert state.update(closes[t]) == pytest.approx(expected[t], abs=EXACT)
+
+
+def test_vectorized_rows_match_reference():
+    closes = np.array([random_closes(500, seed) for seed in range(8)])
+    mask = np.arange(8) % 2 == 0
+
+    state = WilderRSI(n=8)
+    state.seed(closes[:, :300])
+    state.seed(closes[:, :400], rows=mask)  # rows seeded further along
+
+    for t in range(300, 500):
+        state.update(closes[:, t], mask=~mask | (t >= 400))
+
+    for row in range(8):
+        assert state.value()[row] == pytest.approx(reference_RSI(closes[row])[-1], abs=EXACT)
+
+
+def test_history_matches_reference():
+    closes = np.array([random_closes(600, seed) for seed in range(5)]).T
+    closes[:150, 2] = np.nan  # listed later
+
+    RSIs = RSI_history(closes)
+
+    for symbol in range(5):
+        start = np.argmax(~np.isnan(closes[:, symbol]))
+        expected = np.full(len(closes), np.nan)
+        expected[start:] = reference_RSI(closes[start:, symbol])
+
+        np.testing.assert_allclose(RSIs[:, symbol], expected, atol=TALIB_TOLERANCE)
+
+
+def test_incremental_matches_windows():
+    """The incremental state and talib (re-seeded on every window) agree within `TALIB_TOLERANCE`."""
+    closes = random_closes(2000)
+
+    state = WilderRSI()
+    state.seed(closes[:WINDOW])
+
+    for t in range(WINDOW, len(closes)):
+        window = closes[t - WINDOW + 1:t + 1]
+        expected = talib.RSI(window, RSI_PERIOD)[-1] if talib is not None else reference_RSI(window)[-1]
+
+        assert abs(state.update(closes[t]) - expected) < TALIB_TOLERANCE
+
+
+def test_seed_skips_padding():
+    closes = np.array([random_closes(200, seed) for seed in range(4)])
+    lengths = [200, 50, RSI_PERIOD + 1, RSI_PERIOD]
+    for row, length in enumerate(lengths):
+        closes[row, :200 - length] = np.nan  # rows not full yet, as in the candle matrix
+
+    state = WilderRSI(n=4)
+    state.seed(closes)
+
+    for row, length in enumerate(lengths[:-1]):
+        assert state.value()[row] == pytest.approx(reference_RSI(closes[row, -length:])[-1], abs=EXACT)
+
+    assert np.isnan(state.value()[-1])  # fewer than `period` changes
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import utils.clock as clock
+from models.Account import Account
+from models.Pair import Pair
+from models.Position import Position
+from models.PositionBook import PositionBook
+from models.Strategy import Strategy, TRIGGERS
+
+NOW = datetime(2021, 9, 1, 12, 0, 0)
+
+DEFAULTS = {
+    'account_size': 1000.0, 'macro_RSI': False, 'macro_RSIs': [30, 70], 'open_RSIs': [30, 70],
+    'close_RSIs': [70, 30], 'mode': 'neutral', 'profit_close': False, 'risk': 0.01,
+    'stop_loss': 0.03, 'take_profit': 0.02, 'timer_trigger': 60,
+}
+
+
+@pytest.fixture(autouse=True)
+def frozen_clock():
+    clock.set_source(lambda: NOW)
+    yield
+    clock.set_source(datetime.now)
+
+
+def create_strategy(**parameters):
+    return Strategy(Account(1000.0), DEFAULTS, parameters)
+
+
+def create_position(symbol, side, tactic, entry_price, opened_at, strategy):
+    position = Position.__new__(Position)
+    position.symbol, position.side, position.entry_trigger = symbol, side, tactic
+    position.entry_price, position.opened_at = entry_price, opened_at
+    position.set_SL_and_TP(strategy)
+
+    return position
+
+
+def random_book(rng, strategy, n):
+    """Return a book of `n` random positions, and prices and RSIs which hit every trigger's boundaries."""
+    book = PositionBook()
+
+    for i in range(n):
+        entry_price = float(rng.choice([1.0, 10.0, 100.0]))
+
+        # Up to three days ago: durations over a day wrap around like `timedelta.seconds`
+        opened_at = NOW - timedelta(minutes=int(rng.integers(0, 3 * 24 * 60)), seconds=int(rng.integers(0, 60)))
+
+        book.add(create_position(
+            f'S{i}/USDT', rng.choice(['buy', 'sell']), rng.choice(['trend', 'reversal']),
+            entry_price, opened_at, strategy
+        ))
+
+    positions = book.arrays()
+    change = rng.choice([-0.05, -0.03, -0.02, -0.01, 0.0, 0.01, 0.02, 0.03, 0.05], size=n)
+    prices = positions.entry_prices * (1 + change)
+
+    # Prices exactly on the SL or TP too
+    exact = rng.random(n)
+    prices = np.where(exact < 0.1, positions.stop_losses, np.where(exact < 0.2, positions.take_profits, prices))
+
+    # Integer RSIs land on the close triggers now and then
+    RSIs = rng.integers(0, 101, size=n).astype(np.float64)
+
+    return positions, prices, RSIs
+
+
+def assert_parity(strategy, positions, prices, RSIs, macro_RSI):
+    """Assert `should_close_all` returns what `should_close` does, position by position."""
+    needs_to_close, codes = strategy.should_close_all(positions, prices, RSIs, macro_RSI, NOW)
+
+    expected = [
+        strategy.should_close(position, Pair(position.symbol, price, RSI), macro_RSI)
+        for position, price, RSI in zip(positions.positions, prices, RSIs)
+    ]
+
+    assert needs_to_close.tolist() == [close for close, _ in expected]
+    assert [TRIGGERS[code] for code in codes] == [trigger for _, trigger in expected]
+
+    return {trigger for _, trigger in expected}
+
+
+@pytest.mark.parametrize('profit_close', [False, True])
+@pytest.mark.parametrize('macro_RSIs', [[30, 70], [40, 60], [50, 50]])
+@pytest.mark.parametrize('close_RSIs', [[70, 30], [50, 50]])
+def test_should_close_all_matches_should_close(profit_close, macro_RSIs, close_RSIs):
+    rng = np.random.default_rng(42)
+    strategy = create_strategy(profit_close=profit_close, macro_RSIs=macro_RSIs, close_RSIs=close_RSIs)
+    triggers = set()
+
+    # Macro-RSIs on, around, and beyond both macro triggers
+    for macro_RSI in [0.0, 20.0, 30.0, 40.0, 49.5, 50.0, 50.5, 60.0, 70.0, 80.0, 100.0]:
+        positions, prices, RSIs = random_book(rng, strategy, 200)
+        triggers |= assert_parity(strategy, positions, prices, RSIs, macro_RSI)
+
+    assert triggers == set(TRIGGERS)
+
+
+def test_should_close_all_precedence():
+    strategy = create_strategy(profit_close=True, timer_trigger=60)
+    old = NOW - timedelta(hours=2)
+
+    book = PositionBook()
+    cases = [
+        # (side, tactic, price change, RSI, expected trigger) at a macro-RSI of 50
+        ('buy', 'trend', -0.05, 80.0, 'trend-tactic'),    # over the SL, reversed, and timed out too
+        ('buy', 'reversal', 0.05, 80.0, 'reversal-tactic'),  # over the TP and timed out too
+        ('buy', 'reversal', -0.05, 80.0, 'SL'),           # reversed, but at a loss (profit close)
+        ('sell', 'reversal', -0.05, 50.0, 'TP'),          # timed out too
+        ('sell', 'reversal', 0.0, 50.0, 'timer'),
+    ]
+
+    for i, (side, tactic, _, _, _) in enumerate(cases):
+        book.add(create_position(f'S{i}/USDT', side, tactic, 100.0, old, strategy))
+
+    positions = book.arrays()
+    prices = np.array([100.0 * (1 + change) for _, _, change, _, _ in cases])
+    RSIs = np.array([RSI for _, _, _, RSI, _ in cases])
+
+    assert_parity(strategy, positions, prices, RSIs, 50.0)
+
+    _, codes = strategy.should_close_all(positions, prices, RSIs, 50.0, NOW)
+    assert [TRIGGERS[code] for code in codes] == [trigger for *_, trigger in cases]
+
+
+def test_should_close_all_macro_opposed_precedes_reversal():
+    strategy = create_strategy(macro_RSIs=[30, 70])
+
+    book = PositionBook()
+    book.add(create_position('A/USDT', 'buy', 'reversal', 100.0, NOW, strategy))
+    book.add(create_position('B/USDT', 'sell', 'reversal', 100.0, NOW, strategy))
+    positions = book.arrays()
+
+    prices, RSIs = np.array([100.0, 100.0]), np.array([90.0, 10.0])  # both reversed
+
+    for macro_RSI, expected in [(30.0, ['macro-opposed', 'reversal-tactic']), (70.0, ['reversal-tactic', 'macro-opposed'])]:
+        assert_parity(strategy, positions, prices, RSIs, macro_RSI)
+
+        _, codes = strategy.should_close_all(positions, prices, RSIs, macro_RSI, NOW)
+        assert [TRIGGERS[code] for code in codes] == expected
+
+
+def test_should_close_all_timer_wraps_daily():
+    strategy = create_strategy(timer_trigger=60)
+
+    # `timedelta.seconds` ignores whole days: 1 day and 30 minutes is 30 minutes
+    book = PositionBook()
+    book.add(create_position('A/USDT', 'buy', 'reversal', 100.0, NOW - timedelta(days=1, minutes=30), strategy))
+    book.add(create_position('B/USDT', 'buy', 'reversal', 100.0, NOW - timedelta(days=1, minutes=60), strategy))
+    book.add(create_position('C/USDT', 'buy', 'reversal', 100.0, NOW - timedelta(minutes=59, seconds=59), strategy))
+    positions = book.arrays()
+
+    prices, RSIs = np.full(3, 100.0), np.full(3, 50.0)
+
+    assert_parity(strategy, positions, prices, RSIs, 50.0)
+
+    needs_to_close, _ = strategy.should_close_all(positions, prices, RSIs, 50.0, NOW)
+    assert needs_to_close.tolist() == [False, True, False]
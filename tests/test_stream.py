@@ -0,0 +1,243 @@
+import base64
+import hashlib
+import json
+import queue
+import socket
+import struct
+import time
+from threading import Thread
+
+import numpy as np
+import pytest
+
+import utils.aggregator as aggregator
+import utils.binance as binance
+from utils.candles import KLINE_DTYPE, CandleStore
+from utils.stream import KlineStream
+
+MINUTE = 60_000
+GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'  # RFC 6455's handshake key suffix
+TIMEOUT = 10  # seconds
+
+
+class FakeStreamServer:
+    def __init__(self):
+        """Local WebSocket server accepting connections and pushing the frames it is given."""
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen()
+
+        self.url = f'ws://127.0.0.1:{self.sock.getsockname()[1]}/stream?streams='
+        self.paths = []                   # requested path of every connection
+        self.connections = queue.Queue()  # sockets of the accepted connections, once upgraded
+
+        Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:  # closed
+                return
+
+            request = b''
+            while b'\r\n\r\n' not in request:
+                request += client.recv(4096)
+
+            lines = request.decode().split('\r\n')
+            headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+            accept = base64.b64encode(hashlib.sha1((headers['Sec-WebSocket-Key'] + GUID).encode()).digest())
+
+            client.sendall(
+                b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n'
+            )
+
+            self.paths.append(lines[0].split()[1])
+            self.connections.put(client)
+
+            Thread(target=self.read, args=(client,), daemon=True).start()
+
+    @staticmethod
+    def read(client):
+        """Discard the client's frames, answering its close frame (so closing does not time out)."""
+        def receive(size):
+            data = b''
+            while len(data) < size:
+                chunk = client.recv(size - len(data))
+                if not chunk:
+                    raise OSError('Connection closed')
+                data += chunk
+            return data
+
+        try:
+            while True:
+                first, second = receive(2)
+                length = second & 0x7f
+
+                if length == 126:
+                    length, = struct.unpack('!H', receive(2))
+                elif length == 127:
+                    length, = struct.unpack('!Q', receive(8))
+
+                receive(4 + length)  # mask key and payload
+
+                if first & 0x0f == 0x8:
+                    client.sendall(b'\x88\x00')
+                    client.close()
+                    return
+        except OSError:  # dropped by the test
+            return
+
+    @staticmethod
+    def send(client, message):
+        """Send a (final, unmasked) text frame."""
+        payload = message.encode()
+
+        if len(payload) < 126:
+            header = struct.pack('!BB', 0x81, len(payload))
+        else:
+            header = struct.pack('!BBH', 0x81, 126, len(payload))
+
+        client.sendall(header + payload)
+
+    def close(self):
+        self.sock.close()
+
+
+def kline_frame(symbol, kline):
+    """Return a combined-stream kline frame, with Binance's string-encoded prices."""
+    time, open_, high, low, close, volume = kline.tolist()
+
+    return json.dumps({'stream': f'{symbol.lower()}@kline_1m', 'data': {'e': 'kline', 'k': {
+        's': symbol, 't': time, 'o': str(open_), 'h': str(high), 'l': str(low), 'c': str(close),
+        'v': str(volume), 'x': False,
+    }}})
+
+
+def klines(start, count):
+    """Return `count` one-minute klines opened every minute from `start`."""
+    candles = np.zeros(count, dtype=KLINE_DTYPE)
+    candles['time'] = start + np.arange(count) * MINUTE
+    candles['close'] = 100 + np.arange(count)
+    candles['open'], candles['high'], candles['low'] = candles['close'], candles['close'] + 1, candles['close'] - 1
+    candles['volume'] = 1.0
+
+    return candles
+
+
+@pytest.fixture
+def market(monkeypatch):
+    """Candle store of two symbols, and the exchange's klines served by a stubbed REST `get_klines`."""
+    symbols = ['BTC/USDT', 'ETH/USDT']
+    start = (int(time.time() * 1000) // MINUTE - aggregator.LOOKBACK + 1) * MINUTE
+    history = {symbol.replace('/', ''): klines(start, aggregator.LOOKBACK) for symbol in symbols}
+    requests = []
+
+    def get_klines(symbol, limit=200, interval='1m'):
+        requests.append((symbol, limit))
+        return history[symbol][-limit:], 200, None
+
+    store = CandleStore(symbols, aggregator.LOOKBACK)
+    for i, symbol in enumerate(symbols):
+        store.load(i, history[symbol.replace('/', '')])
+
+    monkeypatch.setattr(binance, 'get_klines', get_klines)
+    monkeypatch.setattr(aggregator, 'store', store)
+
+    return store, history, requests
+
+
+@pytest.fixture
+def server():
+    server = FakeStreamServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def stream(market, server):
+    store, _, _ = market
+    stream = KlineStream(store, '1m', backfill=aggregator.fetch_candles, url=server.url)
+    stream.start()
+
+    yield stream
+
+    stream.stop()
+
+
+def connect(server, stream):
+    """Return the next connection, once the stream has backfilled it."""
+    client = server.connections.get(timeout=TIMEOUT)
+    assert stream.wait(TIMEOUT)  # set by `on_open`, after backfilling
+
+    return client
+
+
+def test_subscribes_to_combined_kline_streams(market, server, stream):
+    _, _, requests = market
+    connect(server, stream)
+
+    assert server.paths == ['/stream?streams=btcusdt@kline_1m/ethusdt@kline_1m']
+    assert {symbol for symbol, _ in requests} == {'BTCUSDT', 'ETHUSDT'}
+
+
+def test_merges_streamed_klines(market, server, stream):
+    store, history, _ = market
+    client = connect(server, stream)
+
+    # The forming candle is updated in place...
+    forming = history['BTCUSDT'][-1].copy()
+    forming['close'] = 123.5
+    server.send(client, kline_frame('BTCUSDT', forming))
+
+    assert stream.wait(TIMEOUT)
+    assert store.last_close(0) == 123.5
+    assert store.last_time(0) == forming['time']
+
+    # ...and the next one is appended, dropping the oldest
+    following = klines(forming['time'] + MINUTE, 1)[0]
+    server.send(client, kline_frame('BTCUSDT', following))
+
+    assert stream.wait(TIMEOUT)
+    assert store.last_time(0) == following['time']
+    assert store.counts[0] == aggregator.LOOKBACK
+    assert store.matrix()['close'][0, -2] == 123.5
+
+    # Other symbols are left alone
+    assert store.last_time(1) == history['ETHUSDT'][-1]['time']
+
+
+def test_backfills_gaps_in_the_stream(market, server, stream):
+    store, history, requests = market
+    client = connect(server, stream)
+    requests.clear()
+
+    # A kline two minutes ahead: the one in between was missed
+    history['ETHUSDT'] = np.concatenate([history['ETHUSDT'], klines(history['ETHUSDT'][-1]['time'] + MINUTE, 2)])
+    server.send(client, kline_frame('ETHUSDT', history['ETHUSDT'][-1]))
+
+    assert stream.wait(TIMEOUT)
+    assert {symbol for symbol, _ in requests} == {'ETHUSDT'}
+    assert np.array_equal(store.matrix()[1], history['ETHUSDT'][-aggregator.LOOKBACK:])
+
+
+def test_reconnects_and_backfills_after_a_drop(market, server, stream):
+    store, history, requests = market
+    client = connect(server, stream)
+    requests.clear()
+
+    # Candles keep opening on the exchange while disconnected
+    for symbol in history:
+        history[symbol] = np.concatenate([history[symbol], klines(history[symbol][-1]['time'] + MINUTE, 3)])
+
+    client.shutdown(socket.SHUT_RDWR)
+    client.close()
+
+    connect(server, stream)
+
+    assert len(server.paths) == 2
+    assert {symbol for symbol, _ in requests} == {'BTCUSDT', 'ETHUSDT'}
+
+    for i, symbol in enumerate(['BTCUSDT', 'ETHUSDT']):
+        assert np.array_equal(store.matrix()[i], history[symbol][-aggregator.LOOKBACK:])
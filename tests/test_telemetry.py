@@ -0,0 +1,92 @@
+import time
+
+import pytest
+from loguru import logger
+
+import utils.telemetry as telemetry
+from utils.telemetry import Sink
+
+
+@pytest.fixture
+def sink(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return Sink('history', 'symbol,price', archive=None)
+
+
+@pytest.fixture
+def errors():
+    messages = []
+    handler = logger.add(lambda message: messages.append(message.strip()), level='ERROR', format='{message}')
+
+    yield messages
+
+    logger.remove(handler)
+
+
+def read(sink):
+    with open(sink.path) as fd:
+        return fd.read().splitlines()
+
+
+def test_close_writes_queued_rows(sink):
+    for i in range(1000):
+        sink.write('BTC', i)
+
+    sink.close()
+
+    assert read(sink) == ['symbol,price'] + [f'BTC,{i}' for i in range(1000)]
+
+
+def test_writer_stops_at_the_sentinel(sink):
+    sink.close()
+
+    # Rows queued after the sentinel (e.g. by late writers) are not written, and do not crash the writer
+    for row in [('BTC', 1), None, ('ETH', 2)]:
+        sink.queue.put(row)
+
+    sink.open()
+    sink.run()
+
+    assert sink.fd.closed
+    assert read(sink) == ['symbol,price', 'BTC,1']
+
+
+def test_dropped_rows_are_logged(sink, monkeypatch, errors):
+    monkeypatch.setattr(telemetry, 'MAX_BYTES', 0)  # rotate after every batch
+
+    sink.dropped = 3
+    sink.write('BTC', 1)
+    sink.close()
+
+    assert errors == [f'Dropped 3 rows of {sink.path}: the writer could not keep up']
+
+
+def test_writer_survives_disk_errors(sink, monkeypatch, errors):
+    def move(source, destination):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(telemetry, 'MAX_BYTES', 0)  # rotate after every batch
+    monkeypatch.setattr(telemetry.shutil, 'move', move)
+
+    sink.write('BTC', 1)
+
+    while not errors:
+        time.sleep(0.01)
+
+    sink.write('ETH', 2)
+    sink.close()
+
+    assert errors[0] == 'Failed writing 1 rows to history.csv: No space left on device'
+    assert read(sink) == ['symbol,price', 'BTC,1', 'ETH,2']
+
+
+def test_close_does_not_wait_for_a_dead_writer(sink):
+    sink.queue.put(None)
+    sink.thread.join()
+
+    for i in range(telemetry.QUEUE_SIZE):
+        sink.write('BTC', i)
+
+    sink.close()  # would block on the full queue
+
+    assert sink.dropped == 0
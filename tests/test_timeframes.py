@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from utils.candles import KLINE_DTYPE, CandleStore
+from utils.indicators import RSI_PERIOD, TALIB_TOLERANCE
+from utils.timeframes import Timeframe
+
+from test_indicators import EXACT, random_closes, reference_RSI
+
+SIZE = 200  # candles kept per symbol
+
+
+def create_timeframe(lengths):
+    """Return a base timeframe whose rows hold the given number of 1m candles."""
+    store = CandleStore([f'S{row}/USDT' for row in range(len(lengths))], SIZE)
+
+    for row, length in enumerate(lengths):
+        klines = np.zeros(length, dtype=KLINE_DTYPE)
+        klines['time'] = np.arange(length) * 60_000
+        klines['close'] = random_closes(length, row)
+        store.load(row, klines)
+
+    return Timeframe('1m', store.symbols, SIZE, store=store)
+
+
+def test_short_rows_get_an_RSI():
+    lengths = [SIZE, 50, RSI_PERIOD + 1, RSI_PERIOD]
+    timeframe = create_timeframe(lengths)
+    candles = timeframe.store.matrix()
+
+    RSIs = timeframe.update_RSIs(candles['time'], candles['close'])
+
+    for row, length in enumerate(lengths[:-1]):
+        closes = candles['close'][row, -length:]
+        assert RSIs[row] == pytest.approx(reference_RSI(closes)[-1], abs=EXACT)
+
+    assert np.isnan(RSIs[-1])  # fewer than `RSI_PERIOD + 1` closes
+
+
+def test_short_rows_keep_their_RSI():
+    timeframe = create_timeframe([SIZE, 50])
+    store = timeframe.store
+
+    for minute in range(SIZE, SIZE + 20):
+        for row in range(2):
+            kline = np.zeros((), dtype=KLINE_DTYPE)
+            kline['time'], kline['close'] = minute * 60_000, store.last_close(row) * 1.001 ** (-1) ** minute
+            store.push(row, kline)
+
+        candles = store.matrix()
+        RSIs = timeframe.update_RSIs(candles['time'], candles['close'])
+
+        # The full row drops its oldest candles, which a reference re-seeded on the window does not count
+        for row, tolerance in enumerate([TALIB_TOLERANCE, EXACT]):
+            closes = candles['close'][row][~np.isnan(candles['close'][row])]
+            assert RSIs[row] == pytest.approx(reference_RSI(closes)[-1], abs=tolerance)
@@ -0,0 +1,134 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import utils.userstream as userstream
+from utils.userstream import UserStream
+
+from test_stream import TIMEOUT, FakeStreamServer
+
+
+class FakeExchange:
+    """The listenKey endpoints of the exchange, handing out a new key on every connection."""
+    def __init__(self):
+        self.keys, self.renewals = 0, 0
+
+    def fapiPrivate_post_listenkey(self):
+        self.keys += 1
+        return {'listenKey': f'key-{self.keys}'}
+
+    def fapiPrivate_put_listenkey(self):
+        self.renewals += 1
+        return {}
+
+
+def order_frame(order_id, status, price, filled, commission=0.0, asset='USDT'):
+    """Return an ORDER_TRADE_UPDATE frame, with Binance's string-encoded numbers."""
+    return json.dumps({'e': 'ORDER_TRADE_UPDATE', 'o': {
+        's': 'BTCUSDT', 'i': order_id, 'X': status, 'ap': str(price), 'z': str(filled),
+        'n': str(commission), 'N': asset,
+    }})
+
+
+def eventually(condition):
+    """Wait until the stream thread has processed what the condition checks."""
+    deadline = time.time() + TIMEOUT
+
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def server():
+    server = FakeStreamServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def exchange():
+    return FakeExchange()
+
+
+@pytest.fixture
+def stream(monkeypatch, server, exchange):
+    # Reconnect and renew the listenKey without waiting for seconds (or half an hour)
+    monkeypatch.setattr(userstream, 'time', SimpleNamespace(time=time.time, sleep=lambda _: time.sleep(0.05)))
+
+    stream = UserStream(exchange, url=server.url.split('/stream')[0] + '/ws/')
+    stream.start()
+
+    yield stream
+
+    stream.stop()
+
+
+def connect(server, stream):
+    client = server.connections.get(timeout=TIMEOUT)
+    assert stream.connected.wait(TIMEOUT)
+
+    return client
+
+
+def test_connects_with_a_renewed_listen_key(server, stream, exchange):
+    connect(server, stream)
+
+    assert server.paths == ['/ws/key-1']
+    eventually(lambda: exchange.renewals > 0)
+
+
+def test_records_partial_fills_and_their_commissions(server, stream):
+    client = connect(server, stream)
+    position = SimpleNamespace(sl_id='1', tp_id='2')
+
+    server.send(client, order_frame(2, 'NEW', 0, 0))
+    server.send(client, order_frame(1, 'PARTIALLY_FILLED', 100.0, 0.4, 0.0144))
+    eventually(lambda: stream.fill(1) is not None)
+
+    assert stream.fill(1) == ('BTCUSDT', 'PARTIALLY_FILLED', 100.0, 0.4, 0.0144)
+    assert stream.exit_trigger(position) is None
+
+    server.send(client, order_frame(1, 'FILLED', 100.5, 1.0, 0.0216))
+    eventually(lambda: stream.fill(1).status == 'FILLED')
+
+    assert stream.fill(1).price == 100.5
+    assert stream.fill(1).filled == 1.0
+    assert stream.fill(1).commission == pytest.approx(0.036)
+    assert stream.exit_trigger(position) == 'SL'
+
+
+def test_commissions_in_other_assets_are_unknown(server, stream):
+    client = connect(server, stream)
+
+    server.send(client, order_frame(3, 'PARTIALLY_FILLED', 100.0, 0.4, 0.0144))
+    server.send(client, order_frame(3, 'FILLED', 100.0, 1.0, 0.00005, asset='BNB'))
+    eventually(lambda: stream.fill(3) is not None and stream.fill(3).status == 'FILLED')
+
+    assert stream.fill(3).commission is None
+    assert stream.exit_trigger(SimpleNamespace(sl_id='4', tp_id='3')) == 'TP'
+
+
+def test_pushes_the_USDT_balance(server, stream):
+    client = connect(server, stream)
+    balances = []
+    stream.subscribe(lambda allocated, available: balances.append((allocated, available)))
+
+    server.send(client, json.dumps({'e': 'ACCOUNT_UPDATE', 'a': {'B': [
+        {'a': 'BNB', 'wb': '1.5', 'cw': '1.5'},
+        {'a': 'USDT', 'wb': '1000.0', 'cw': '750.0'},
+    ]}}))
+    eventually(lambda: balances)
+
+    assert balances == [(250.0, 750.0)]
+
+
+def test_reconnects_when_the_listen_key_expires(server, stream):
+    client = connect(server, stream)
+
+    server.send(client, json.dumps({'e': 'listenKeyExpired'}))
+    connect(server, stream)
+
+    assert server.paths == ['/ws/key-1', '/ws/key-2']
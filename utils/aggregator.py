@@ -1,33 +1,244 @@
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 from loguru import logger
-from talib import RSI as rsi
 
-from models.Pair import Pair
+from models.Market import Market
 import utils.binance as binance
+from utils.candles import CandleStore, interval_to_ms
+import utils.clock as clock
+from utils.constants import INTERVAL
+import utils.metrics as metrics
+from utils.stream import KlineStream
+import utils.telemetry as telemetry
+from utils.timeframes import Timeframe, check_interval
 
+LOOKBACK = 200          # candles kept per symbol (i.e. RSI lookback)
+INCREMENTAL_LIMIT = 99  # largest incremental request which still weighs 1
+MAX_WORKERS = binance.MAX_CONNECTIONS  # NOTE: more workers than pooled connections just queue up
 
-def get_market_data(symbols):
-    """Fetch prices from Binance and calculate RSIs. Return pairs and macro-RSI."""
-    pairs = []
+INTERVAL_MS = interval_to_ms(INTERVAL)
 
-    # Request the candlesticks of each symbol and calculate its RSI
-    for symbol in symbols:
-        closes, code, error = binance.get_close_candles(symbol.replace('/', ''))
+intervals = [INTERVAL]  # timeframes of the strategies; only INTERVAL (i.e. the base) is fetched
+store = None            # CandleStore with the base candles of the scanned symbols
+timeframes = {}         # Timeframe of every interval, by interval (the base one shares `store`)
+
+
+def set_intervals(strategy_intervals):
+    """Set the timeframes to maintain. Raise ValueError if one cannot be rolled up from INTERVAL."""
+    global intervals
+
+    for interval in strategy_intervals:
+        check_interval(interval, INTERVAL)
+
+    intervals = sorted(set(strategy_intervals) | {INTERVAL}, key=interval_to_ms)
+
+
+@metrics.timed('market_data')
+def get_market_data(symbols, fetch=True):
+    """
+    Fetch prices from Binance (unless streamed), roll them up, and calculate RSIs.
+
+    Return the market and macro-RSI of every timeframe, by interval.
+    """
+    if store is None or store.symbols != symbols:
+        allocate(symbols)
+
+    if fetch:
+        code, error = fetch_candles(symbols)
 
         if code != 200:
-            return [], [], [code, error]
+            return {}, {}, [code, error]
+
+    with store.lock:
+        candles = store.matrix()
 
-        # Last value of the array is the most recent
-        price, RSI = closes[-1], rsi(closes)[-1]
+    code, error = roll_up(candles)
 
-        pairs.append(Pair(symbol, price, RSI))
+    if code != 200:
+        return {}, {}, [code, error]
 
+    markets, macro_RSIs = {}, {}
+
+    for interval, timeframe in timeframes.items():
+        bars = timeframe.store.matrix() if timeframe.rolled else candles
+        RSIs = timeframe.update_RSIs(bars['time'], bars['close'])
+
+        markets[interval] = Market(symbols, candles['close'][:, -1], RSIs, bars)
+
+        # NOTE: symbols without enough candles yet have a NaN RSI
+        macro_RSIs[interval] = float(np.nanmean(RSIs))
+
+    market = markets[INTERVAL]
+    for symbol, price, RSI in zip(symbols, market.prices, market.RSIs):
         logger.debug(f'💡 {symbol[:-5]:<8} - 📟 ${price:<11} 📈 {RSI:.2f}')
 
-    macro_RSI = sum(map(lambda p: p.RSI, pairs)) / len(pairs)
+    telemetry.write('macro-history', macro_RSIs[INTERVAL], clock.now())
+
+    return markets, macro_RSIs, None
+
+
+def allocate(symbols):
+    """Allocate the candle buffers and RSI state of the given symbols, for every interval."""
+    global store
+
+    store = CandleStore(symbols, LOOKBACK)
+
+    timeframes.clear()
+    timeframes.update({
+        interval: Timeframe(interval, symbols, LOOKBACK, store=store if interval == INTERVAL else None)
+        for interval in intervals
+    })
+
+
+def state():
+    """Return the candle buffers and RSI state as arrays, by name (e.g. to snapshot them)."""
+    if store is None:
+        return {}
+
+    arrays = {'symbols': np.array(store.symbols)}
+
+    with store.lock:
+        for interval, timeframe in timeframes.items():
+            prefix = '' if interval == INTERVAL else interval + ':'
+            arrays.update({prefix + name: array for name, array in timeframe.state().items()})
+
+    return arrays
+
+
+def restore(symbols, arrays):
+    """Allocate the given symbols' buffers and restore the rows of those found in `arrays`."""
+    allocate(symbols)
+
+    saved = {symbol: i for i, symbol in enumerate(arrays['symbols'].tolist())}
+    rows = np.array([i for i, symbol in enumerate(symbols) if symbol in saved], dtype=np.intp)
+    sources = np.array([saved[symbols[i]] for i in rows], dtype=np.intp)
+
+    for interval, timeframe in timeframes.items():
+        prefix = '' if interval == INTERVAL else interval + ':'
+
+        # Timeframes new to the session are loaded on the first scan
+        if prefix + 'candles' in arrays:
+            saved_state = {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+            timeframe.restore(rows, saved_state, sources)
+
+    return len(rows)
+
+
+def update_RSIs(times, closes):
+    """Commit all newly closed base candles to the RSI state. Return the forming candles' RSIs."""
+    return timeframes[INTERVAL].update_RSIs(times, closes)
+
+
+def roll_up(candles):
+    """Roll the base candles up into every other timeframe. Return the first HTTP error, if any."""
+    for timeframe in timeframes.values():
+        if not timeframe.rolled:
+            continue
+
+        cold = timeframe.roll_up(candles)
+
+        # Only rows never loaded (or after a long gap) cost request weight: fetch their bars once
+        if cold.any():
+            code, error = load_candles(timeframe, np.flatnonzero(cold), candles['time'][:, -2])
+
+            if code != 200:
+                return code, error
+
+            timeframe.roll_up(candles)
+
+    return 200, None
+
+
+def load_candles(timeframe, rows, folded):
+    """Fetch the timeframe's candles of the given rows concurrently. Return the first HTTP error, if any."""
+    def load(i):
+        klines, code, error = binance.get_klines(store.symbols[i].replace('/', ''), LOOKBACK, timeframe.interval)
+
+        if code == 200 and len(klines):
+            timeframe.load(i, klines, folded[i])
+
+        return code, error
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [executor.submit(load, i) for i in rows]
+
+        for future in futures:
+            code, error = future.result()
+
+            if code != 200:
+                for pending in futures:
+                    pending.cancel()
+
+                return code, error
+
+    return 200, None
+
+
+def start_stream(symbols):
+    """Warm up the candle buffers via REST and keep them updated with kline streams."""
+    if store is None or store.symbols != symbols:  # unless restored from a snapshot
+        allocate(symbols)
+
+    code, error = fetch_candles(symbols)
+
+    if code != 200:
+        return None, [code, error]
+
+    stream = KlineStream(store, INTERVAL, backfill=fetch_candles)
+    stream.start()
+
+    return stream, None
+
+
+def fetch_candles(symbols):
+    """Update the candles of the given symbols concurrently. Return the first HTTP error, if any."""
+    now = int(time.time() * 1000)
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [executor.submit(update_candles, symbol, now) for symbol in symbols]
+
+        for future in futures:
+            code, error = future.result()
+
+            if code != 200:
+                # Do not waste request weight on a scan which is going to be discarded
+                for pending in futures:
+                    pending.cancel()
+
+                return code, error
+
+    return 200, None
+
+
+def update_candles(symbol, now, full=False):
+    """Fetch the symbol's candles missing from its buffer and merge them. Return status and error."""
+    i = store.index[symbol]
+    limit = LOOKBACK
+
+    # After warm-up, only request the candles opened since the last scan (plus the last one)
+    if not full and store.counts[i] == LOOKBACK:
+        missing = (now - store.last_time(i)) // INTERVAL_MS + 2
+
+        if missing <= INCREMENTAL_LIMIT:
+            limit = int(missing)
+
+    klines, code, error = binance.get_klines(symbol.replace('/', ''), limit)
+
+    if code != 200:
+        return code, error
+
+    with store.lock:
+        if limit == LOOKBACK:
+            store.load(i, klines)
+        elif len(klines) and klines[0]['time'] <= store.last_time(i):
+            store.merge(i, klines)
+        else:
+            full = True
 
-    with open('macro-history.csv', 'a') as fd:
-        fd.write(f'{macro_RSI},{datetime.now()}\n')
+    # Gap between the buffer and the returned candles: warm up again
+    if full and limit != LOOKBACK:
+        return update_candles(symbol, now, full=True)
 
-    return pairs, macro_RSI, None
+    return code, None
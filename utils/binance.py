@@ -3,15 +3,26 @@ import time
 
 import numpy as np
 from requests import Session
+from requests.adapters import HTTPAdapter
 from urllib import parse as urllib
 
+from utils.candles import KLINE_DTYPE
 from utils.constants import BINANCE_APIKEY, BINANCE_SECRETKEY, INTERVAL
+import utils.metrics as metrics
+import utils.weight as weight
+
+try:
+    from orjson import loads  # optional, parses klines about 30% faster
+except ImportError:
+    from json import loads
 
 
 BASEURL = 'https://fapi.binance.com/fapi'
+MAX_CONNECTIONS = 10   # size of the session's connection pool (i.e. max concurrent requests)
 
 s = Session()
 s.headers.update({ 'X-MBX-APIKEY': BINANCE_APIKEY })
+s.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONNECTIONS))
 
 
 # NOTE: unused
@@ -19,12 +30,15 @@ def get_account_info():
     """Get current account information, including positions. Weight: 5"""
     endpoint = BASEURL + '/v2/account'
 
+    weight.acquire(5, weight.ACCOUNT)
+
     resp = s.get(endpoint, params=sign_timestamp())
+    weight.observe(resp.headers, resp.status_code)
 
     return resp.json(), resp.status_code
 
 
-def get_close_candles(symbol, limit=200):
+def get_close_candles(symbol, limit=200, interval=INTERVAL):
     """
     Get the last {limit} kline/candlestick close values for a symbol's interval.
 
@@ -34,21 +48,46 @@ def get_close_candles(symbol, limit=200):
     [500, 1000] 5
     > 1000      10
     """
-    closes = np.array([])
+    klines, code, error = get_klines(symbol, limit, interval)
+
+    return klines['close'] if code == 200 else [], code, error
+
+
+def get_klines(symbol, limit=200, interval=INTERVAL):
+    """Get the last {limit} klines of a symbol at the interval as typed columns (see KLINE_DTYPE)."""
     endpoint = BASEURL + '/v1/klines'
 
-    resp = s.get(endpoint, params={
-        'interval': INTERVAL, 'symbol': symbol, 'limit': limit
-    })
+    weight.acquire(get_klines_weight(limit), weight.MARKET_DATA)
+
+    with metrics.span('request', endpoint='klines'):
+        resp = s.get(endpoint, params={
+            'interval': interval, 'symbol': symbol, 'limit': limit
+        })
+    weight.observe(resp.headers, resp.status_code)
 
     # Basic error checking
     if resp.status_code != 200:
         return [], resp.status_code, resp.text
 
-    for candle in resp.json():
-        closes = np.append(closes, float(candle[4]))
+    return parse_klines(resp.content), resp.status_code, None
+
+
+def parse_klines(content):
+    """Decode a raw klines response into a structured array (open time, OHLC, and volume)."""
+    # NumPy converts the numeric strings while filling the preallocated columns
+    return np.array([tuple(kline[:6]) for kline in loads(content)], dtype=KLINE_DTYPE)
+
+
+def get_klines_weight(limit):
+    """Return the request weight of a /v1/klines call with the given limit."""
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
 
-    return closes, resp.status_code, None
+    return 10
 
 
 def sign_timestamp():
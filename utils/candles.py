@@ -0,0 +1,122 @@
+from threading import Lock
+
+import numpy as np
+
+UNITS_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+# Typed columns of a kline (i.e. the first 6 fields returned by Binance)
+KLINE_DTYPE = np.dtype([
+    ('time', np.int64),  # open time (ms)
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float64),
+])
+
+
+def interval_to_ms(interval):
+    """Convert a Binance kline interval (e.g. '15m', '4h') to milliseconds."""
+    return int(interval[:-1]) * UNITS_MS[interval[-1]]
+
+
+class CandleStore:
+    def __init__(self, symbols, size=200):
+        """Allocate one fixed-size ring buffer of candles per symbol, keyed by open time."""
+        self.symbols = symbols
+        self.index = {symbol: i for i, symbol in enumerate(symbols)}
+        self.size = size
+
+        self.candles = np.zeros((len(symbols), size), dtype=KLINE_DTYPE)
+        self.times, self.closes = self.candles['time'], self.candles['close']  # column views
+
+        self.heads = np.zeros(len(symbols), dtype=np.int64)   # slot of each row's oldest candle
+        self.counts = np.zeros(len(symbols), dtype=np.int64)  # number of candles stored per row
+
+        self.lock = Lock()  # held while writing or reading rows shared with other threads
+
+    def __str__(self):
+        return f'CandleStore({len(self.symbols)} symbols, size={self.size})'
+
+    def last_slot(self, i):
+        """Return the slot of the row's most recent (i.e. still forming) candle."""
+        return (self.heads[i] + self.counts[i] - 1) % self.size
+
+    def last_time(self, i):
+        """Return the open time of the row's most recent candle."""
+        return self.times[i, self.last_slot(i)]
+
+    def last_close(self, i):
+        """Return the close (i.e. current price) of the row's most recent candle."""
+        return self.closes[i, self.last_slot(i)]
+
+    def load(self, i, klines):
+        """Overwrite the row with the most recent `size` klines given."""
+        klines = klines[-self.size:]
+        count = len(klines)
+
+        self.candles[i, :count] = klines
+        self.heads[i], self.counts[i] = 0, count
+
+    def push(self, i, kline):
+        """Append a new candle to the row, dropping the oldest one if the buffer is full."""
+        if self.counts[i] < self.size:
+            slot = (self.heads[i] + self.counts[i]) % self.size
+            self.counts[i] += 1
+        else:
+            slot = self.heads[i]
+            self.heads[i] = (slot + 1) % self.size
+
+        self.candles[i, slot] = kline
+
+    def merge(self, i, klines):
+        """Merge recent klines into the row. Return the number of newly opened candles."""
+        last_slot = self.last_slot(i)
+        last_time = self.times[i, last_slot]
+        opened = 0
+
+        for kline in klines:
+            if kline['time'] < last_time:
+                continue
+
+            if kline['time'] == last_time:
+                # Replace the (previously) forming candle with its latest values
+                self.candles[i, last_slot] = kline
+            else:
+                self.push(i, kline)
+
+                last_slot = self.last_slot(i)
+                last_time = kline['time']
+                opened += 1
+
+        return opened
+
+    def put(self, mask, candles):
+        """Merge one candle (not older than the row's last) into each masked row, all rows at once."""
+        rows = np.flatnonzero(mask)
+        heads, counts = self.heads[rows], self.counts[rows]
+        candles = candles[rows]
+
+        last_slots = (heads + counts - 1) % self.size
+        opened = (counts == 0) | (candles['time'] != self.times[rows, last_slots])
+        full = counts == self.size
+
+        # New candles go after the last one (i.e. over the oldest when full); others replace it
+        self.candles[rows, np.where(opened, (heads + counts) % self.size, last_slots)] = candles
+        self.heads[rows] = np.where(opened & full, (heads + 1) % self.size, heads)
+        self.counts[rows] = np.where(opened & ~full, counts + 1, counts)
+
+    def matrix(self):
+        """Return the candles of all rows as a (n_symbols, size) chronological array.
+
+        Rows are right-aligned (the last column holds the forming candles) and rows which are not
+        full yet are front-padded with -1 (times) and NaN (prices and volume). Costs a single gather.
+        """
+        offsets = np.arange(self.size) - (self.size - self.counts[:, None])  # < 0 for missing candles
+        slots = (self.heads[:, None] + offsets) % self.size
+        rows = np.arange(len(self.symbols))[:, None]
+
+        candles = self.candles[rows, slots]
+        candles[offsets < 0] = (-1,) + (np.nan,) * (len(KLINE_DTYPE) - 1)
+
+        return candles
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+# Function returning the current time; backtests replace it with a simulated clock
+source = datetime.now
+
+
+def now():
+    """Return the current (live or simulated) time."""
+    return source()
+
+
+def set_source(function):
+    """Make `now()` return the time given by `function` (e.g. a backtest's tick)."""
+    global source
+
+    source = function
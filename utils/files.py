@@ -0,0 +1,11 @@
+import os
+
+
+def write_atomically(path, text):
+    """Replace a file's content so readers see either the old or the new version, never a mix."""
+    temporary = path + '.tmp'
+
+    with open(temporary, 'w') as fd:
+        fd.write(text)
+
+    os.replace(temporary, path)  # atomic rename on POSIX and Windows
@@ -0,0 +1,104 @@
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from utils.indicators import RSI_history
+
+try:
+    import pandas as pd  # optional, parses CSV much faster and is needed for Parquet files
+except ImportError:
+    pd = None
+
+CACHE_DIR = '.cache'  # created inside the data directory
+
+
+def load_history(directory, mmap=False):
+    """
+    Load every `<BASE>USDT.csv` (or `.parquet`) kline file of a directory, aligned on open time.
+
+    Files follow Binance's kline dumps (open time in ms as the 1st column, close as the 5th).
+    Return symbols, open times (n_ticks,), and closes (n_ticks, n_symbols). Closes are NaN outside
+    a symbol's first and last candles (e.g. once delisted), and forward-filled over missing ones.
+
+    The aligned arrays are cached as .npy files next to the data, so later loads are instant and,
+    with `mmap`, can be shared between processes through the page cache.
+    """
+    directory = Path(directory)
+    cache = directory / CACHE_DIR
+    files = sorted(list(directory.glob('*.csv')) + list(directory.glob('*.parquet')))
+
+    if not files:
+        raise FileNotFoundError(f'No kline files found in {directory}')
+
+    newest = max(file.stat().st_mtime for file in files)
+
+    if not (cache / 'closes.npy').exists() or (cache / 'closes.npy').stat().st_mtime < newest:
+        logger.info(f'Parsing {len(files)} kline files from {directory}...')
+        cache.mkdir(exist_ok=True)
+
+        times, closes = align([read_klines(file) for file in files])
+        symbols = [file.stem[:-4] + '/USDT' for file in files]
+
+        np.save(cache / 'times.npy', times)
+        np.save(cache / 'closes.npy', closes)
+        (cache / 'symbols.txt').write_text('\n'.join(symbols) + '\n')
+
+    mode = 'r' if mmap else None
+
+    return (
+        (cache / 'symbols.txt').read_text().split(),
+        np.load(cache / 'times.npy', mmap_mode=mode),
+        np.load(cache / 'closes.npy', mmap_mode=mode),
+    )
+
+
+def load_RSIs(directory, period, mmap=False):
+    """Load (or compute and cache) the RSI history of a directory's klines for the given period."""
+    path = Path(directory) / CACHE_DIR / f'RSI_{period}.npy'
+    _, _, closes = load_history(directory, mmap=True)
+
+    if not path.exists() or path.stat().st_mtime < (path.parent / 'closes.npy').stat().st_mtime:
+        logger.info(f'Computing RSI({period}) history...')
+        np.save(path, RSI_history(closes, period))
+
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+
+def read_klines(path):
+    """Return the open times and closes of a kline file."""
+    if path.suffix == '.parquet':
+        frame = pd.read_parquet(path)
+        return frame.iloc[:, 0].to_numpy(np.int64), frame.iloc[:, 4].to_numpy(np.float64)
+
+    # Newer dumps start with a header line
+    with open(path) as fd:
+        header = not fd.readline()[:1].isdigit()
+
+    if pd is not None:
+        frame = pd.read_csv(path, header=None, usecols=[0, 4], skiprows=int(header))
+        return frame[0].to_numpy(np.int64), frame[4].to_numpy(np.float64)
+
+    data = np.loadtxt(path, delimiter=',', usecols=(0, 4), skiprows=int(header), ndmin=2)
+
+    return data[:, 0].astype(np.int64), data[:, 1]
+
+
+def align(klines):
+    """Align the (times, closes) of each symbol on the union of all open times."""
+    times = np.unique(np.concatenate([symbol_times for symbol_times, _ in klines]))
+    closes = np.full((len(times), len(klines)), np.nan)
+
+    for column, (symbol_times, symbol_closes) in enumerate(klines):
+        closes[np.searchsorted(times, symbol_times), column] = symbol_closes
+
+    # Forward-fill missing candles: take the close of the last tick having one
+    ticks = np.where(np.isnan(closes), 0, np.arange(len(times))[:, None])
+    np.maximum.accumulate(ticks, axis=0, out=ticks)
+    lasts = ticks[-1].copy()  # last tick of each symbol (e.g. delisted since)
+    closes = closes[ticks, np.arange(len(klines))]
+
+    # ...but not past a symbol's last candle, or its RSI would stay frozen at its last value
+    closes[np.arange(len(times))[:, None] > lasts] = np.nan
+
+    return times, closes
@@ -0,0 +1,135 @@
+import numpy as np
+
+RSI_PERIOD = 14
+TALIB_TOLERANCE = 1e-4  # maximum RSI difference with talib over 200-candle windows (see `WilderRSI`)
+
+
+def to_RSI(avg_gain, avg_loss):
+    """Convert Wilder's average gain and loss to RSI; 0 when both are 0 (as talib does)."""
+    total = avg_gain + avg_loss
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total != 0, 100 * avg_gain / total, 0.0)[()]
+
+
+class WilderRSI:
+    def __init__(self, period=RSI_PERIOD, n=None):
+        """Incremental RSI keeping Wilder's smoothed average gain and loss as state.
+
+        With `n`, the state holds one RSI per row (e.g. symbol) and every method works on all
+        rows in a single vectorized pass.
+
+        Seeded like talib (SMA of the first `period` changes). Since talib re-seeds at the start
+        of every window, both differ by less than `TALIB_TOLERANCE` over 200-candle windows.
+        """
+        self.period = period
+        shape = () if n is None else n
+
+        self.avg_gain = np.full(shape, np.nan)[()]
+        self.avg_loss = np.full(shape, np.nan)[()]
+        self.last_close = np.full(shape, np.nan)[()]  # last committed (i.e. closed candle) close
+
+    def __str__(self):
+        return f'WilderRSI({self.period}) = {self.value()}'
+
+    def seed(self, closes, rows=None):
+        """Initialise the state (of the given rows) from more than `period` committed closes.
+
+        Closes are ordered oldest first along the last axis. Rows may be front-padded with NaN
+        (e.g. new listings): each is seeded from its first `period` changes, or left NaN without them.
+        """
+        if rows is not None:
+            closes = closes[rows]
+
+        changes = np.diff(closes, axis=-1)
+        gains, losses = np.maximum(changes, 0), np.maximum(-changes, 0)
+
+        n_changes = changes.shape[-1]
+        starts = np.argmax(~np.isnan(changes), axis=-1)[..., None]  # first change of each row
+        ends = starts + self.period                                  # first change smoothed in
+
+        # SMA of the first `period` changes, from cumulative sums so all rows take a single pass
+        zeros = np.zeros(changes.shape[:-1] + (1,))
+        gain_sums = np.concatenate([zeros, np.nancumsum(gains, axis=-1)], axis=-1)
+        loss_sums = np.concatenate([zeros, np.nancumsum(losses, axis=-1)], axis=-1)
+        windows = np.minimum(ends, n_changes)
+
+        avg_gain = (np.take_along_axis(gain_sums, windows, -1) - np.take_along_axis(gain_sums, starts, -1))
+        avg_loss = (np.take_along_axis(loss_sums, windows, -1) - np.take_along_axis(loss_sums, starts, -1))
+        avg_gain, avg_loss = avg_gain[..., 0] / self.period, avg_loss[..., 0] / self.period
+
+        short = ends[..., 0] > n_changes  # fewer than `period` changes
+        avg_gain, avg_loss = np.where(short, np.nan, avg_gain), np.where(short, np.nan, avg_loss)
+
+        for k in range(self.period, n_changes):
+            smoothed = k >= ends[..., 0]
+
+            avg_gain = np.where(smoothed, (avg_gain * (self.period - 1) + gains[..., k]) / self.period, avg_gain)
+            avg_loss = np.where(smoothed, (avg_loss * (self.period - 1) + losses[..., k]) / self.period, avg_loss)
+
+        avg_gain, avg_loss = avg_gain[()], avg_loss[()]
+
+        if rows is None:
+            # NOTE: copied, so that seeding rows later does not write into the caller's closes
+            self.avg_gain, self.avg_loss, self.last_close = avg_gain, avg_loss, closes[..., -1].copy()
+        else:
+            self.avg_gain[rows], self.avg_loss[rows] = avg_gain, avg_loss
+            self.last_close[rows] = closes[..., -1]
+
+    def step(self, close):
+        """Return the average gain and loss after `close`, without changing the state. O(1)."""
+        change = close - self.last_close
+
+        avg_gain = (self.avg_gain * (self.period - 1) + np.maximum(change, 0)) / self.period
+        avg_loss = (self.avg_loss * (self.period - 1) + np.maximum(-change, 0)) / self.period
+
+        return avg_gain, avg_loss
+
+    def update(self, close, mask=None):
+        """Commit the close of candles which have just closed (only in the masked rows)."""
+        avg_gain, avg_loss = self.step(close)
+
+        if mask is None:
+            self.avg_gain, self.avg_loss, self.last_close = avg_gain, avg_loss, close
+        else:
+            self.avg_gain = np.where(mask, avg_gain, self.avg_gain)
+            self.avg_loss = np.where(mask, avg_loss, self.avg_loss)
+            self.last_close = np.where(mask, close, self.last_close)
+
+        return self.value()
+
+    def peek(self, close):
+        """Return the provisional RSI of the still forming candle, without committing it."""
+        return to_RSI(*self.step(close))
+
+    def value(self):
+        """Return the RSI of the last committed close."""
+        return to_RSI(self.avg_gain, self.avg_loss)
+
+
+def RSI_history(closes, period=RSI_PERIOD):
+    """Return the RSI at every tick of (n_ticks, n_symbols) closes, like talib.RSI per symbol.
+
+    Symbols may start later (NaN-padded closes); their RSI is NaN until they have `period` changes.
+    Loops over ticks only, so each step is a few operations on a vector of all symbols.
+    """
+    n_ticks = closes.shape[0]
+    RSIs = np.full(closes.shape, np.nan, dtype=np.float32)
+
+    starts = np.argmax(~np.isnan(closes), axis=0)  # first tick with a close, per symbol
+    state = WilderRSI(period, n=closes.shape[1])
+
+    for t in range(period, n_ticks):
+        # Seed symbols reaching `period` changes; step the already seeded ones
+        seeding = starts + period == t
+        seeded = starts + period < t
+
+        if seeding.any():
+            state.seed(closes[t - period:t + 1].T, rows=seeding)
+
+        if seeded.any():
+            state.update(closes[t], mask=seeded)
+
+        RSIs[t] = state.value()
+
+    return RSIs
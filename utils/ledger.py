@@ -0,0 +1,65 @@
+import json
+import os
+import sys
+import time
+
+SYNC_EVERY = 100    # records appended between fsyncs
+SYNC_INTERVAL = 5   # maximum seconds between fsyncs
+
+
+class Ledger:
+    def __init__(self, path):
+        """Append-only JSON Lines file: one record per line, fsynced in batches."""
+        self.path = path
+        self.fd = open(path, 'a')
+
+        self.pending = 0  # records written but not fsynced yet
+        self.synced_at = time.time()
+
+    def __str__(self):
+        return f'Ledger({self.path}, {self.pending} pending)'
+
+    def append(self, record):
+        """Append a record in O(1). It reaches the OS immediately and the disk in batches."""
+        self.fd.write(json.dumps(record, default=str) + '\n')
+        self.fd.flush()
+        self.pending += 1
+
+        if self.pending >= SYNC_EVERY or time.time() - self.synced_at >= SYNC_INTERVAL:
+            self.sync()
+
+    def sync(self):
+        """Force the appended records to disk."""
+        os.fsync(self.fd.fileno())
+
+        self.pending = 0
+        self.synced_at = time.time()
+
+    def close(self):
+        self.sync()
+        self.fd.close()
+
+
+def read(path):
+    """Yield the records of a ledger, oldest first."""
+    with open(path) as fd:
+        for line in fd:
+            # Skip a partially written last line (e.g. after a crash)
+            if line.endswith('\n'):
+                yield json.loads(line)
+
+
+def to_json(path, output=None):
+    """Convert a ledger to the legacy JSON array (by default, `x.jsonl` to `x.json`)."""
+    output = output or path[:-1]
+
+    with open(output, 'w') as fd:
+        fd.write(json.dumps(list(read(path)), indent=4) + '\n')
+
+    return output
+
+
+if __name__ == '__main__':
+    # Usage: python -m utils.ledger <ledger.jsonl> [...]
+    for path in sys.argv[1:]:
+        print(to_json(path))
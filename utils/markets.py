@@ -0,0 +1,121 @@
+import hashlib
+import json
+import math
+import time
+from pathlib import Path
+from threading import Thread
+
+import ccxt
+from loguru import logger
+
+import utils.retry as retry
+from utils.files import write_atomically
+
+# Absolute, since sessions move the working directory
+CACHE_PATH = Path(__file__).resolve().parent.parent / '.cache' / 'markets.json'
+TTL = 60 * 60  # seconds before cached markets are refreshed (in the background)
+
+limits = {}  # symbol -> (step size, min quantity, min notional), of the loaded markets
+
+
+def load(exchange, keep):
+    """
+    Load the exchange's markets for which `keep(market)` is true, from the cache when possible.
+
+    Cached markets are used right away, even if expired, and refreshed in a background thread
+    when so. Without a (valid) cache they are fetched from the exchange first.
+    """
+    cached, fetched_at = read()
+
+    if cached is None:
+        refresh(exchange, keep)
+        return
+
+    exchange.set_markets(cached)
+    index(cached)
+
+    age = time.time() - fetched_at
+    logger.debug(f'Loaded {len(cached)} markets from cache ({age / 60:.0f} minutes old)')
+
+    if age >= TTL:
+        Thread(target=refresh_quietly, args=(exchange, keep), name='markets', daemon=True).start()
+
+
+def refresh(exchange, keep):
+    """Fetch the markets from the exchange, filter them, and cache them if they changed."""
+    markets = retry.call('load_markets', exchange.load_markets, True)
+    markets = {symbol: market for symbol, market in markets.items() if keep(market)}
+
+    exchange.set_markets(markets)
+    index(markets)
+
+    digest = hash_markets(markets)
+    cached, _ = read()
+
+    if cached is None or digest != hash_markets(cached):
+        logger.info(f'Caching {len(markets)} updated markets')
+
+    # Rewritten even if unchanged, to renew its TTL
+    CACHE_PATH.parent.mkdir(exist_ok=True)
+    write_atomically(str(CACHE_PATH), json.dumps({'fetched_at': time.time(), 'hash': digest, 'markets': markets}))
+
+
+def refresh_quietly(exchange, keep):
+    """Refresh the markets, keeping the cached ones on failure."""
+    try:
+        refresh(exchange, keep)
+    except ccxt.BaseError as e:
+        logger.error(f'Failed refreshing markets, keeping the cached ones: {e}')
+
+
+def read():
+    """Return the cached markets and their fetch time, or None if missing or corrupt."""
+    try:
+        cache = json.loads(CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return None, None
+
+    if cache.get('hash') != hash_markets(cache.get('markets', {})):
+        logger.warning(f'Ignoring corrupt markets cache {CACHE_PATH}')
+        return None, None
+
+    return cache['markets'], cache['fetched_at']
+
+
+def hash_markets(markets):
+    """Return the SHA-256 digest of the markets' canonical JSON."""
+    return hashlib.sha256(json.dumps(markets, sort_keys=True).encode()).hexdigest()
+
+
+def index(markets):
+    """Precompute each symbol's order limits from its exchangeInfo filters."""
+    for symbol, market in markets.items():
+        filters = {f['filterType']: f for f in market['info'].get('filters', [])}
+        lot = filters.get('MARKET_LOT_SIZE') or filters.get('LOT_SIZE') or {}
+        notional = filters.get('MIN_NOTIONAL', {})
+
+        limits[symbol] = (
+            float(lot.get('stepSize', 0)),
+            float(lot.get('minQty', 0)),
+            float(notional.get('notional', notional.get('minNotional', 0))),
+        )
+
+
+def check_order(symbol, cost, price):
+    """Return why a market order of the given cost would be rejected, or None if it would not."""
+    if symbol not in limits:
+        return None
+
+    step, min_quantity, min_notional = limits[symbol]
+    quantity = cost / price
+
+    if step:
+        quantity = math.floor(quantity / step + 1e-9) * step  # quantities are truncated to the step
+
+    if quantity < min_quantity or quantity <= 0:
+        return f'quantity {quantity:g} is below the minimum of {min_quantity:g}'
+
+    if quantity * price < min_notional:
+        return f'notional ${quantity * price:.4f} is below the minimum of ${min_notional:g}'
+
+    return None
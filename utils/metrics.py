@@ -0,0 +1,162 @@
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+from loguru import logger
+
+PREFIX = 'delfos_'
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # seconds
+
+enabled = False  # while False, every function below is (almost) free
+histograms = {}  # (name, labels) -> Histogram
+counters = {}    # (name, labels) -> value
+collectors = []  # functions returning extra (kind, name, labels, value) samples at scrape time
+lock = Lock()
+
+NO_SPAN = nullcontext()
+
+
+class Histogram:
+    def __init__(self):
+        """Cumulative histogram of durations, in Prometheus' fixed buckets."""
+        self.counts = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+
+class Span:
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+
+    def __exit__(self, *exception):
+        record(self.key, time.perf_counter() - self.started_at)
+
+
+def observe(name, value, **labels):
+    """Record a duration (in seconds) in the named histogram."""
+    if enabled:
+        record((name, tuple(sorted(labels.items()))), value)
+
+
+def record(key, value):
+    with lock:
+        if key not in histograms:
+            histograms[key] = Histogram()
+
+        histograms[key].observe(value)
+
+
+def span(name, **labels):
+    """Return a context timing its block into the named histogram."""
+    if not enabled:
+        return NO_SPAN
+
+    return Span((name, tuple(sorted(labels.items()))))
+
+
+def timed(name, **labels):
+    """Decorate a function to time its calls into the named histogram."""
+    key = (name, tuple(sorted(labels.items())))
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+
+            started_at = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(key, time.perf_counter() - started_at)
+
+        return wrapper
+
+    return decorator
+
+
+def inc(name, value=1, **labels):
+    """Increase the named counter."""
+    if not enabled:
+        return
+
+    key = (name, tuple(sorted(labels.items())))
+
+    with lock:
+        counters[key] = counters.get(key, 0) + value
+
+
+def render():
+    """Return all metrics in Prometheus' text exposition format."""
+    lines = []
+
+    with lock:
+        samples = [('counter', name, labels, value) for (name, labels), value in counters.items()]
+        histogram_items = [(key, list(h.counts), h.sum) for key, h in histograms.items()]
+
+    for collect in collectors:
+        samples.extend(collect())
+
+    for kind, name, labels, value in sorted(samples, key=lambda s: (s[1], s[2])):
+        suffix = '_total' if kind == 'counter' else ''
+        lines.append(f'{PREFIX}{name}{suffix}{format_labels(labels)} {value}')
+
+    for (name, labels), counts, total in sorted(histogram_items):
+        cumulative = 0
+
+        for bound, count in zip(BUCKETS + ('+Inf',), counts):
+            cumulative += count
+            lines.append(f'{PREFIX}{name}_seconds_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+
+        lines.append(f'{PREFIX}{name}_seconds_sum{format_labels(labels)} {total}')
+        lines.append(f'{PREFIX}{name}_seconds_count{format_labels(labels)} {cumulative}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+
+        body = render().encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the logs
+
+
+def start(port, host='127.0.0.1'):
+    """Enable instrumentation and serve it at http://host:port/metrics."""
+    global enabled
+
+    enabled = True
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+
+    logger.info(f'Serving metrics at http://{host}:{port}/metrics')
+
+    return server
@@ -0,0 +1,79 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import ccxt
+
+from models.Position import Position
+import utils.binance as binance
+import utils.markets as markets
+
+MAX_WORKERS = binance.MAX_CONNECTIONS  # concurrent order round-trips (i.e. symbols) at most
+
+executor = None  # shared by all REAL strategies, created on first use
+
+
+def submit(function, *args):
+    """Run a blocking exchange call in the order threads. Return its future."""
+    global executor
+
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='orders')
+
+    return executor.submit(function, *args)
+
+
+def open_positions(strategy, signals, macro_RSI):
+    """
+    Yield the (signal, cost, opening) of every signal the strategy can afford, in order.
+
+    `opening()` returns the opened Position or raises the exchange error. Paper positions are
+    opened lazily, so each cost sees the bookkeeping of the previous ones. REAL entries (with their
+    SL/TP) are sent concurrently up front, budgeting the account as if all of them were filled.
+    """
+    account = strategy.account
+
+    if not strategy.REAL:
+        for signal in signals:
+            # HACK: for real accounts, calculate using free balance from Binance
+            cost = strategy.determine_position_cost() / 5  # divide for testing purposes
+
+            # This check is needed in the edge case of `strategy.RISK > strategy.STOP_LOSS`
+            if cost <= account.available and account.free_trading_slots >= 1:
+                yield signal, cost, lambda signal=signal, cost=cost: Position(signal, cost, strategy, macro_RSI)
+
+        return
+
+    available, slots = account.available, account.free_trading_slots
+    entries = []
+
+    for signal in signals:
+        cost = strategy.determine_position_cost() / 5
+
+        if cost <= available and slots >= 1:
+            # Reject undersized orders locally rather than waiting for Binance's -4003/-4164 errors
+            rejection = markets.check_order(signal.symbol, cost, signal.price)
+
+            if rejection is not None:
+                entries.append((signal, cost, partial(reject, rejection)))
+                continue
+
+            future = submit(Position, signal, cost, strategy, macro_RSI)
+            entries.append((signal, cost, future.result))
+
+            available -= cost
+            slots = math.floor(available * strategy.STOP_LOSS * strategy.RISK * 100)
+
+    yield from entries
+
+
+def reject(reason):
+    raise ccxt.InvalidOrder(reason)
+
+
+def close_positions(strategy, closing, macro_RSI):
+    """Send the closing orders of (position, pair, trigger) concurrently. Return their futures."""
+    return [
+        submit(position.close, pair, strategy, trigger, macro_RSI)
+        for position, pair, trigger in closing
+    ]
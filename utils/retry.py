@@ -0,0 +1,159 @@
+import random
+import time
+from threading import Lock
+
+import ccxt
+from loguru import logger
+
+MAX_ATTEMPTS = 5         # tries per call, the first one included
+BASE_DELAY = 0.5         # seconds before the first retry, doubled on each following one...
+MAX_DELAY = 30.0         # ...up to this
+RETRY_BUDGET = 20        # retries allowed per endpoint and minute, whatever the number of calls
+BREAKER_THRESHOLD = 10   # consecutive failures opening an endpoint's circuit...
+BREAKER_COOLDOWN = 60.0  # ...which rejects calls for these seconds, then lets one through
+
+endpoints = {}  # endpoint name -> Endpoint
+endpoints_lock = Lock()
+
+
+class CircuitOpen(ccxt.NetworkError):
+    """Raised without calling the exchange while an endpoint's circuit is open."""
+
+
+class Endpoint:
+    def __init__(self, name):
+        """Retry budget, circuit breaker, and metrics of an exchange endpoint."""
+        self.name = name
+        self.lock = Lock()
+
+        self.failures = 0        # consecutive failed attempts
+        self.opened_at = None    # time the circuit opened (None: closed)
+        self.retries_minute, self.minute_retries = 0, 0
+
+        # Metrics (totals)
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0          # calls given up on
+        self.rejected = 0        # calls rejected by the open circuit
+        self.latency = 0.0       # seconds spent in successful attempts
+
+    def __str__(self):
+        state = 'open' if self.opened_at is not None else 'closed'
+        return f'Endpoint({self.name}, {self.calls} calls, {self.retries} retries, ' \
+            f'{self.errors} errors, {self.rejected} rejected, circuit {state})'
+
+    def admit(self):
+        """Raise CircuitOpen if calls are rejected right now."""
+        with self.lock:
+            self.calls += 1
+
+            if self.opened_at is None:
+                return
+
+            # Half-open: after the cooldown, let a single trial call through
+            if time.monotonic() - self.opened_at >= BREAKER_COOLDOWN:
+                self.opened_at = time.monotonic()
+                return
+
+            self.rejected += 1
+
+        raise CircuitOpen(f'{self.name} circuit is open after {self.failures} consecutive failures')
+
+    def succeed(self, latency):
+        with self.lock:
+            self.failures, self.opened_at = 0, None
+            self.latency += latency
+
+    def fail(self, last):
+        """Record a failed attempt (the call's `last` one or not). Return if it should be retried."""
+        with self.lock:
+            self.failures += 1
+
+            if self.failures >= BREAKER_THRESHOLD:
+                if self.opened_at is None:
+                    logger.critical(f'Opening {self.name} circuit after {self.failures} consecutive failures')
+
+                self.opened_at = time.monotonic()
+
+            if last or self.opened_at is not None:
+                self.errors += 1
+                return False
+
+            minute = int(time.time() // 60)
+            if minute != self.retries_minute:
+                self.retries_minute, self.minute_retries = minute, 0
+
+            if self.minute_retries >= RETRY_BUDGET:
+                self.errors += 1
+                return False
+
+            self.minute_retries += 1
+            self.retries += 1
+
+            return True
+
+
+def endpoint(name):
+    """Return the Endpoint of the given name, created on first use."""
+    with endpoints_lock:
+        if name not in endpoints:
+            endpoints[name] = Endpoint(name)
+
+        return endpoints[name]
+
+
+def call(name, function, *args, attempts=MAX_ATTEMPTS):
+    """
+    Call an exchange function, retrying network errors with exponential backoff and jitter.
+
+    Retries are bounded by `attempts` and the endpoint's budget; an endpoint failing repeatedly
+    opens its circuit and fails fast with CircuitOpen. Use `attempts=1` for non-idempotent calls
+    (e.g. market orders), which could otherwise be executed twice.
+    """
+    state = endpoint(name)
+    state.admit()
+
+    for attempt in range(attempts):
+        started_at = time.monotonic()
+
+        try:
+            result = function(*args)
+        except ccxt.NetworkError as e:
+            if not state.fail(last=attempt == attempts - 1):
+                raise
+
+            # Full jitter keeps clients which failed together from retrying together
+            delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+            logger.warning(f'{name} failed ({e}), retrying in {delay:.2f}s...')
+
+            time.sleep(delay)
+            continue
+        except ccxt.ExchangeError:
+            # The exchange answered (e.g. insufficient margin): the endpoint itself is fine
+            state.succeed(0.0)
+            raise
+
+        state.succeed(time.monotonic() - started_at)
+
+        return result
+
+
+def stats():
+    """Return the metrics of every endpoint, by name."""
+    with endpoints_lock:
+        return {
+            name: {
+                'calls': state.calls, 'retries': state.retries, 'errors': state.errors,
+                'rejected': state.rejected, 'latency': state.latency, 'open': state.opened_at is not None,
+            }
+            for name, state in endpoints.items()
+        }
+
+
+def samples():
+    """Return the endpoints' metrics as (kind, name, labels, value) samples (see `utils.metrics`)."""
+    return [
+        ('counter', f'exchange_{metric}', (('endpoint', name),), value)
+        for name, metrics in stats().items()
+        for metric, value in metrics.items() if metric in ('calls', 'retries', 'errors', 'rejected')
+    ]
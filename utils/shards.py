@@ -0,0 +1,266 @@
+import signal
+import time
+from datetime import datetime
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from loguru import logger
+
+import utils.telemetry as telemetry
+
+HEADER = 1        # tick time (POSIX), ahead of every interval's macro-RSI, the prices, and every interval's RSIs
+SUPERVISOR = -1   # shard index of the supervisor process
+
+TICK_TIMEOUT = 2.0     # seconds the supervisor waits for the shards' replies to a tick
+SETUP_TIMEOUT = 120.0  # idem, for the shards to set up their strategies
+STOP_TIMEOUT = 30.0    # idem, for stopping shards to finish their tick and dump their logs
+JOIN_TIMEOUT = 10.0    # seconds a stopping shard gets to exit before it is terminated
+MAX_LATE_TICKS = 30    # consecutive ticks a shard may miss before it is deemed hung
+
+# Supervisor
+workers = []    # (process, connection) of every shard
+segment = None  # MarketSegment published to the shards
+tick = 0        # number of the last published tick
+sent = []       # number of the last tick sent to each shard
+pending = []    # if each shard has yet to reply to the last tick sent
+late = []       # consecutive ticks each shard has missed the deadline of
+
+# Shards: logs and telemetry rows of the current tick, sent back to the supervisor with its reply
+records = []
+rows = []
+
+
+class MarketSegment:
+    def __init__(self, n_symbols, intervals, name=None):
+        """
+        Prices, and RSIs at every interval, of all symbols in shared memory: written by the supervisor,
+        read by the shards.
+        """
+        self.intervals = intervals
+
+        n_intervals = len(intervals)
+        size = HEADER + n_intervals + (1 + n_intervals) * n_symbols
+        self.memory = SharedMemory(name=name, create=name is None, size=size * 8)
+
+        self.array = np.ndarray(size, dtype=np.float64, buffer=self.memory.buf)
+        self.macro_RSIs = self.array[HEADER:HEADER + n_intervals]
+        self.prices = self.array[HEADER + n_intervals:HEADER + n_intervals + n_symbols]
+        self.RSIs = self.array[HEADER + n_intervals + n_symbols:].reshape(n_intervals, n_symbols)
+
+    def __str__(self):
+        return f'MarketSegment({self.memory.name}, {len(self.prices)} symbols @ {", ".join(self.intervals)})'
+
+    def publish(self, markets, macro_RSIs, now):
+        # All markets share their prices
+        self.prices[:] = markets[self.intervals[0]].prices
+
+        for k, interval in enumerate(self.intervals):
+            self.RSIs[k] = markets[interval].RSIs
+            self.macro_RSIs[k] = macro_RSIs[interval]
+
+        self.array[:HEADER] = now.timestamp()
+
+    def read(self):
+        """Return the macro-RSIs, tick time, copies of the prices, and copies of the RSIs, by interval."""
+        timestamp = self.array[0]
+
+        return (
+            dict(zip(self.intervals, self.macro_RSIs.tolist())), datetime.fromtimestamp(timestamp),
+            self.prices.copy(), dict(zip(self.intervals, self.RSIs.copy())),
+        )
+
+    def close(self, unlink=False):
+        del self.array, self.macro_RSIs, self.prices, self.RSIs  # release the buffer's exports first
+        self.memory.close()
+
+        if unlink:
+            self.memory.unlink()
+
+
+class Relay:
+    def __init__(self, name):
+        """Stand-in for a telemetry Sink in shards: rows go to the supervisor, which owns the files."""
+        self.name = name
+
+    def write(self, *fields):
+        rows.append((self.name, fields))
+
+    def close(self):
+        pass
+
+
+def owns(shard, i, raw_strategy):
+    """
+    Return if the `i`th strategy of strategies.json runs in the `(index, count)` shard.
+
+    REAL strategies run in the supervisor, which owns the exchange and the user-data stream; paper
+    strategies are dealt round-robin to the shards.
+    """
+    index, count = shard
+
+    if raw_strategy.get('REAL', False):
+        return index == SUPERVISOR
+
+    return index != SUPERVISOR and i % count == index
+
+
+def start(count, symbols, intervals, target, *args):
+    """
+    Start `count` shards running `target(index, count, segment name, connection, symbols, intervals, *args)`.
+
+    Return if all of them set up their strategies.
+    """
+    global segment
+
+    segment = MarketSegment(len(symbols), intervals)
+
+    # NOTE: spawned, not forked: the supervisor's snapshot connection, sockets and threads must not be shared
+    context = get_context('spawn')
+
+    for index in range(count):
+        connection, child = context.Pipe()
+        process = context.Process(
+            target=target, args=(index, count, segment.memory.name, child, symbols, intervals, *args),
+            name=f'shard-{index}', daemon=True
+        )
+        process.start()
+
+        workers.append((process, connection))
+        sent.append(tick)
+        pending.append(True)
+        late.append(0)
+
+    return collect(SETUP_TIMEOUT)
+
+
+def publish(markets, macro_RSIs, now):
+    """
+    Write the tick's markets to the shared segment and let every shard trade them.
+
+    Shards still trading an earlier tick (see `collect`) skip this one.
+    """
+    global tick
+
+    tick += 1
+    segment.publish(markets, macro_RSIs, now)
+
+    for index, (_, connection) in enumerate(workers):
+        if pending[index]:
+            continue
+
+        try:
+            connection.send(tick)
+            sent[index], pending[index] = tick, True
+        except OSError:  # dead shard, reported by `collect`
+            pass
+
+
+def collect(timeout=TICK_TIMEOUT):
+    """
+    Wait (up to `timeout` seconds overall) for every shard's reply to its last tick, and log their records.
+
+    Shards missing the deadline are skipped until they reply (their records are logged then), so a
+    hung paper shard never holds up the supervisor's strategies. Return if all succeeded, i.e. none
+    died, failed, or missed MAX_LATE_TICKS ticks in a row.
+    """
+    succeeded = True
+    logged_pairs = set()
+    deadline = time.monotonic() + timeout
+
+    for index, (process, connection) in enumerate(workers):
+        if not pending[index]:
+            continue
+
+        # Replies of a tick interrupted by CTRL-C (or missed) are still pending: log them too
+        while True:
+            if not connection.poll(max(deadline - time.monotonic(), 0)):
+                late[index] += 1
+                logger.error(f'{process.name} missed the tick deadline ({late[index]} in a row); skipping it')
+
+                succeeded &= late[index] < MAX_LATE_TICKS
+                break
+
+            try:
+                replied, ok, shard_records, shard_rows = connection.recv()
+            except EOFError:
+                logger.critical(f'{process.name} died (exit code {process.exitcode})')
+                replied, ok, shard_records, shard_rows = sent[index], False, [], []
+
+            for level, message in shard_records:
+                logger.log(level, message)
+
+            for name, fields in shard_rows:
+                # Every shard logs the prices of its positions' symbols
+                if name == 'price-history':
+                    if fields[0] in logged_pairs:
+                        continue
+                    logged_pairs.add(fields[0])
+
+                telemetry.write(name, *fields)
+
+            succeeded &= ok
+
+            if replied == sent[index]:
+                pending[index], late[index] = False, 0
+                break
+
+    return succeeded
+
+
+def stop():
+    """Let the shards dump their logs and exit, then release the shared segment."""
+    global segment
+
+    if not workers:
+        return
+
+    # Late shards reply to their last tick before dumping
+    collect(STOP_TIMEOUT)
+
+    for index, (_, connection) in enumerate(workers):
+        try:
+            connection.send(None)
+            pending[index] = True
+        except OSError:  # already dead
+            pass
+
+    collect(STOP_TIMEOUT)
+
+    for process, connection in workers:
+        process.join(JOIN_TIMEOUT)
+
+        if process.is_alive():
+            logger.critical(f'{process.name} did not exit; terminating it')
+            process.terminate()
+
+        connection.close()
+
+    workers.clear()
+    sent.clear()
+    pending.clear()
+    late.clear()
+    segment.close(unlink=True)
+    segment = None
+
+
+def init_shard():
+    """Route the shard's logs and telemetry to the supervisor, which also handles CTRL-C."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    logger.remove()
+    logger.add(
+        lambda message: records.append((message.record['level'].name, message.record['message'])),
+        level='DEBUG', format='{message}'
+    )
+
+    telemetry.sinks.clear()
+    telemetry.sinks.update({name: Relay(name) for name in telemetry.SINKS})
+
+
+def reply(connection, replied, ok=True):
+    """Send the tick's records back to the supervisor."""
+    connection.send((replied, ok, records[:], rows[:]))
+
+    records.clear()
+    rows.clear()
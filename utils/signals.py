@@ -0,0 +1,90 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Immutable open signal of a symbol for a strategy (quacks like a Pair for Position)
+Signal = namedtuple('Signal', ['symbol', 'price', 'RSI', 'side', 'tactic', 'strength'])
+
+
+def evaluate_signals(market, macro_RSI, strategies):
+    """Return each strategy's open signals, sorted so most extreme RSIs get priority.
+
+    Strategies sharing the same triggers share a single vectorized evaluation over all symbols.
+    """
+    RSIs = np.asarray(market.RSIs, dtype=np.float64)
+    evaluated = {}
+
+    signals = []
+
+    for strategy in strategies:
+        key = triggers(strategy)
+
+        if key not in evaluated:
+            evaluated[key] = evaluate(market, RSIs, macro_RSI, strategy)
+
+        signals.append(evaluated[key])
+
+    return signals
+
+
+def evaluate_timeframes(markets, macro_RSIs, strategies):
+    """Return each strategy's open signals, evaluated on the market and macro-RSI of its interval."""
+    signals = [None] * len(strategies)
+
+    for interval, market in markets.items():
+        indices = [i for i, strategy in enumerate(strategies) if strategy.INTERVAL == interval]
+        evaluated = evaluate_signals(market, macro_RSIs[interval], [strategies[i] for i in indices])
+
+        for i, potential in zip(indices, evaluated):
+            signals[i] = potential
+
+    return signals
+
+
+def triggers(strategy):
+    """Return the parameters deciding which symbols a strategy would open."""
+    return (
+        strategy.MACRO_RSI, strategy.MACRO_RSI_MIN, strategy.MACRO_RSI_MAX,
+        strategy.OPEN_RSI_MIN, strategy.OPEN_RSI_MAX, strategy.MODE,
+    )
+
+
+def evaluate(market, RSIs, macro_RSI, strategy):
+    """Evaluate one set of triggers over all symbols. Return the matching Signals."""
+    # Trend bets come first (strength >= 50 gives them priority); the first rule matching a symbol wins
+    rules = []
+
+    if strategy.MACRO_RSI:
+        # Bet for the bullish trend in a non-overbought asset
+        if macro_RSI >= strategy.MACRO_RSI_MAX and strategy.MODE != 'bearish':
+            rules.append((RSIs < strategy.MACRO_RSI_MAX, 'buy', 'trend', np.abs(macro_RSI - RSIs) + 50))
+
+        # Bet for the bearish trend in a non-oversold asset
+        if macro_RSI <= strategy.MACRO_RSI_MIN and strategy.MODE != 'bullish':
+            rules.append((RSIs > strategy.MACRO_RSI_MIN, 'sell', 'trend', np.abs(macro_RSI - RSIs) + 50))
+
+    # Bet for the asset's bearish reversal when overbought
+    if strategy.MODE != 'bullish':
+        rules.append((RSIs >= strategy.OPEN_RSI_MAX, 'sell', 'reversal', np.abs(50 - RSIs)))
+
+    # Bet for the asset's bullish reversal when oversold
+    if strategy.MODE != 'bearish':
+        rules.append((RSIs <= strategy.OPEN_RSI_MIN, 'buy', 'reversal', np.abs(50 - RSIs)))
+
+    unmatched = np.ones(len(RSIs), dtype=bool)
+    matches = []
+
+    for mask, side, tactic, strengths in rules:
+        mask = mask & unmatched
+        unmatched &= ~mask
+
+        matches.extend((i, side, tactic, strengths[i]) for i in np.flatnonzero(mask))
+
+    # Sort like the live loop did: by symbol, then by strength (stable, so ties keep symbol order)
+    matches.sort(key=lambda match: match[0])
+    matches.sort(key=lambda match: match[3], reverse=True)
+
+    return tuple(
+        Signal(market.symbols[i], market.prices[i], float(RSIs[i]), side, tactic, float(strength))
+        for i, side, tactic, strength in matches
+    )
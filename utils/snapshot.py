@@ -0,0 +1,127 @@
+import json
+import sqlite3
+import time
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+
+from models.Position import Position
+
+SNAPSHOT_PATH = 'session.db'  # inside the session directory
+SNAPSHOT_INTERVAL = 10.0      # minimum seconds between snapshots
+
+ACCOUNT_FIELDS = ('INITIAL_SIZE', 'allocated', 'available', 'free_trading_slots', 'fees', 'pnl', 'loses', 'wins')
+DATETIME_FIELDS = ('opened_at', 'closed_at')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, counters TEXT);
+CREATE TABLE IF NOT EXISTS positions (account TEXT, symbol TEXT, state TEXT, PRIMARY KEY (account, symbol));
+CREATE TABLE IF NOT EXISTS arrays (name TEXT PRIMARY KEY, data BLOB);
+'''
+
+db = None      # connection to the current session's snapshot
+saved_at = 0.0  # UNIX time of the last snapshot
+
+
+def open_snapshot(path=SNAPSHOT_PATH):
+    """Open (or create) the session's snapshot database."""
+    global db
+
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute('PRAGMA journal_mode=WAL')    # a crash mid-write keeps the previous snapshot
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.executescript(SCHEMA)
+
+
+def save(accounts, macro_RSI, state, force=False):
+    """Snapshot the accounts, their positions, and the `state()` arrays (at most every SNAPSHOT_INTERVAL)."""
+    global saved_at
+
+    if db is None or (not force and time.time() - saved_at < SNAPSHOT_INTERVAL):
+        return
+
+    with db:  # a single transaction
+        for account in accounts:
+            name = account.strategy.name
+
+            # NOTE: only this process' accounts are replaced; shards snapshot theirs to the same file
+            db.execute('DELETE FROM accounts WHERE name = ?', (name,))
+            db.execute('DELETE FROM positions WHERE account = ?', (name,))
+
+            counters = {field: getattr(account, field) for field in ACCOUNT_FIELDS}
+
+            db.execute('INSERT INTO accounts VALUES (?, ?)', (name, json.dumps(counters)))
+            db.executemany('INSERT INTO positions VALUES (?, ?, ?)', [
+                (name, position.symbol, json.dumps(position.__dict__, default=str))
+                for position in account.positions
+            ])
+
+        db.executemany('INSERT OR REPLACE INTO arrays VALUES (?, ?)', [
+            (name, to_blob(array)) for name, array in state().items()
+        ])
+        db.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', [
+            ('macro_RSI', json.dumps(macro_RSI)), ('saved_at', json.dumps(time.time())),
+        ])
+
+    saved_at = time.time()
+
+
+def load(path=SNAPSHOT_PATH):
+    """Return the snapshot's (counters, positions) by strategy name, macro-RSI, and arrays."""
+    with sqlite3.connect(f'file:{path}?mode=ro', uri=True) as connection:
+        accounts = {
+            name: (json.loads(counters), [])
+            for name, counters in connection.execute('SELECT name, counters FROM accounts')
+        }
+
+        for name, state in connection.execute('SELECT account, state FROM positions'):
+            accounts[name][1].append(to_position(json.loads(state)))
+
+        meta = {key: json.loads(value) for key, value in connection.execute('SELECT key, value FROM meta')}
+        arrays = {name: from_blob(data) for name, data in connection.execute('SELECT name, data FROM arrays')}
+
+    return accounts, meta.get('macro_RSI'), arrays
+
+
+def restore(account, counters, positions):
+    """Restore an account's counters and open positions."""
+    for field in ACCOUNT_FIELDS:
+        setattr(account, field, counters[field])
+
+    for position in positions:
+        account.positions.add(position)
+
+    account.revision += 1  # dump the restored positions to opened.json
+
+
+def to_position(state):
+    position = Position.__new__(Position)
+    position.__dict__.update(state)
+
+    for field in DATETIME_FIELDS:
+        if position.__dict__.get(field) is not None:
+            setattr(position, field, datetime.fromisoformat(state[field]))
+
+    return position
+
+
+def to_blob(array):
+    buffer = BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+
+    return buffer.getvalue()
+
+
+def from_blob(data):
+    return np.load(BytesIO(data), allow_pickle=False)
+
+
+def close():
+    """Close the snapshot database."""
+    global db
+
+    if db is not None:
+        db.close()
+        db = None
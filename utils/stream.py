@@ -0,0 +1,116 @@
+import json
+import time
+from threading import Event, Thread
+
+import numpy as np
+import websocket
+from loguru import logger
+
+from utils.candles import KLINE_DTYPE, interval_to_ms
+
+STREAM_URL = 'wss://fstream.binance.com/stream?streams='
+MAX_STREAMS = 200        # streams allowed per connection by Binance
+MAX_RECONNECT_DELAY = 60  # seconds
+
+
+class KlineStream:
+    def __init__(self, store, interval, backfill, url=STREAM_URL):
+        """Keep the store's candles updated from Binance's combined kline streams."""
+        self.store = store
+        self.interval = interval
+        self.interval_ms = interval_to_ms(interval)
+        self.backfill = backfill  # function fetching missed candles via REST, given a list of symbols
+        self.url = url
+
+        # Map stream symbols (e.g. 'BTCUSDT') to the store's rows
+        self.rows = {symbol.replace('/', ''): i for symbol, i in store.index.items()}
+
+        self.updated = Event()  # set whenever a candle is updated, cleared by the consumer
+        self.running = False
+        self.sockets, self.threads = [], []
+
+    def __str__(self):
+        return f'KlineStream({len(self.rows)} symbols @ {self.interval}, {len(self.threads)} connections)'
+
+    def start(self):
+        """Open one connection per chunk of MAX_STREAMS symbols, each in its own thread."""
+        self.running = True
+
+        symbols = self.store.symbols
+        for start in range(0, len(symbols), MAX_STREAMS):
+            thread = Thread(target=self.run, args=(symbols[start:start + MAX_STREAMS],), daemon=True)
+            thread.start()
+
+            self.threads.append(thread)
+
+    def stop(self):
+        """Close all connections and stop reconnecting."""
+        self.running = False
+
+        for ws in self.sockets:
+            ws.close()
+
+    def wait(self, timeout=None):
+        """Block until any candle has been updated since the last call. Return if it was updated."""
+        updated = self.updated.wait(timeout)
+        self.updated.clear()
+
+        return updated
+
+    def run(self, symbols):
+        """Consume the symbols' streams forever, reconnecting with exponential backoff."""
+        streams = '/'.join(f'{symbol.replace("/", "").lower()}@kline_{self.interval}' for symbol in symbols)
+        delay = 1
+
+        while self.running:
+            ws = websocket.WebSocketApp(
+                self.url + streams,
+                on_open=lambda ws: self.on_open(symbols),
+                on_message=self.on_message,
+                on_error=lambda ws, e: logger.error(f'Kline stream error: {e}'),
+            )
+            self.sockets.append(ws)
+
+            connected_at = time.time()
+            ws.run_forever(ping_interval=60, ping_timeout=10)
+            self.sockets.remove(ws)
+
+            if not self.running:
+                break
+
+            # Only back off when the connection did not last (e.g. exchange down)
+            delay = 1 if time.time() - connected_at > MAX_RECONNECT_DELAY else min(delay * 2, MAX_RECONNECT_DELAY)
+
+            logger.warning(f'Kline stream disconnected; reconnecting in {delay}s...')
+            time.sleep(delay)
+
+    def on_open(self, symbols):
+        """Backfill via REST the candles missed while (re)connecting."""
+        logger.debug(f'📡 Kline stream connected ({len(symbols)} symbols)')
+
+        code, error = self.backfill(symbols)
+        if code != 200:
+            logger.error(f'HTTP error {code} while backfilling klines: {error}')
+
+        self.updated.set()
+
+    def on_message(self, ws, message):
+        """Merge the streamed kline into the store, backfilling if a gap is found."""
+        kline = json.loads(message)['data']['k']
+        i = self.rows.get(kline['s'])
+
+        if i is None or self.store.counts[i] == 0:
+            return
+
+        with self.store.lock:
+            gap = kline['t'] > self.store.last_time(i) + self.interval_ms
+
+            if not gap:
+                self.store.merge(i, np.array(
+                    [(kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v'])], dtype=KLINE_DTYPE
+                ))
+
+        if gap:
+            self.backfill([self.store.symbols[i]])
+
+        self.updated.set()
@@ -0,0 +1,171 @@
+import gzip
+import shutil
+import time
+from datetime import datetime
+from os import remove
+from queue import Empty, Full, Queue
+from threading import Thread
+
+from loguru import logger
+
+try:
+    import pyarrow.csv as pa_csv  # optional, for columnar (Parquet) archives
+    import pyarrow.parquet as pq
+except ImportError:
+    pa_csv, pq = None, None
+
+QUEUE_SIZE = 100_000     # rows buffered per sink before new ones are dropped
+FLUSH_INTERVAL = 1.0     # maximum seconds between flushes
+MAX_BYTES = 64 << 20     # rotate files bigger than 64 MiB...
+MAX_AGE = 24 * 60 * 60   # ...or older than a day
+
+# Sinks of the session's telemetry files, by name
+SINKS = {
+    'price-history': 'symbol,price,RSI,timestamp',
+    'macro-history': 'macro_RSI,timestamp',
+    'macro-close': 'symbol,side,trigger,entry_trigger,entry_price,exit_price,entry_RSI,exit_RSI,'
+        'entry_macro_RSI,exit_macro_RSI,pnl,net_pnl,opened_at,closed_at',
+}
+
+sinks = {}
+
+
+class Sink:
+    def __init__(self, name, header, archive='gzip'):
+        """CSV file written by a background thread; rows are queued so callers never wait on disk."""
+        self.path = name + '.csv'
+        self.header = header
+        self.archive = archive  # format of rotated files: 'gzip', 'parquet', or None (plain CSV)
+
+        self.queue = Queue(QUEUE_SIZE)
+        self.dropped = 0   # rows discarded because the queue was full
+        self.reported = 0  # dropped rows already logged
+
+        self.open()
+
+        self.thread = Thread(target=self.run, name=f'sink-{name}', daemon=True)
+        self.thread.start()
+
+    def __str__(self):
+        return f'Sink({self.path}, {self.queue.qsize()} queued, {self.dropped} dropped)'
+
+    def write(self, *fields):
+        """Queue a row without blocking. Drop it if the writer cannot keep up."""
+        try:
+            self.queue.put_nowait(fields)
+        except Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write the queued rows and stop the writer (unless it died, leaving the queue full)."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+        self.report_dropped()
+
+    def report_dropped(self):
+        """Log the rows dropped since the last report, if any."""
+        dropped = self.dropped - self.reported
+
+        if dropped:
+            logger.error(f'Dropped {dropped} rows of {self.path}: the writer could not keep up')
+            self.reported += dropped
+
+    def open(self):
+        """Open the file for appending, writing the header if it is new."""
+        self.fd = open(self.path, 'a')  # resumed sessions keep their rows
+
+        if self.fd.tell() == 0:
+            self.fd.write(self.header + '\n')
+
+        self.opened_at = time.time()
+
+    def run(self):
+        """Write queued rows in batches, flushing and rotating the file as needed."""
+        while True:
+            try:
+                row = self.queue.get(timeout=FLUSH_INTERVAL)
+            except Empty:
+                continue
+
+            # Drain whatever else is queued to write it in a single batch, up to the stop sentinel
+            rows, stop = [], row is None
+
+            while not stop:
+                rows.append(row)
+
+                if len(rows) >= 10_000 or self.queue.empty():
+                    break
+
+                row = self.queue.get_nowait()
+                stop = row is None
+
+            # NOTE: a failing disk loses the batch (or rotation), but must not stop the writer
+            try:
+                self.fd.write(''.join(','.join(map(str, row)) + '\n' for row in rows))
+                self.fd.flush()
+
+                if stop:
+                    self.fd.close()
+                    return
+
+                if self.fd.tell() >= MAX_BYTES or time.time() - self.opened_at >= MAX_AGE:
+                    self.rotate()
+                    self.report_dropped()
+            except (OSError, ValueError) as e:  # ValueError: the file was left closed by a failed open
+                logger.error(f'Failed writing {len(rows)} rows to {self.path}: {e}')
+
+                if stop:
+                    return
+
+                if self.fd.closed:
+                    self.reopen()
+
+    def reopen(self):
+        """Try opening the file again after a failure; the next batch retries otherwise."""
+        try:
+            self.open()
+        except OSError as e:
+            logger.error(f'Failed reopening {self.path}: {e}')
+
+    def rotate(self):
+        """Archive the current file and start a new one."""
+        self.fd.close()
+
+        stem = self.path[:-4]
+        rotated = f'{stem}.{datetime.now():%Y%m%d-%H%M%S}.csv'
+        shutil.move(self.path, rotated)
+
+        self.open()
+
+        try:
+            if self.archive == 'parquet' and pq is not None:
+                pq.write_table(pa_csv.read_csv(rotated), rotated[:-4] + '.parquet', compression='zstd')
+                remove(rotated)
+            elif self.archive is not None:
+                with open(rotated, 'rb') as src, gzip.open(rotated + '.gz', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                remove(rotated)
+        except OSError as e:
+            logger.error(f'Failed archiving {rotated}: {e}')
+
+
+def start(archive='gzip'):
+    """Open the session's telemetry sinks in the current directory."""
+    for name, header in SINKS.items():
+        sinks[name] = Sink(name, header, archive)
+
+
+def write(name, *fields):
+    """Queue a row in the given sink, if open (e.g. not in sweep workers)."""
+    sink = sinks.get(name)
+
+    if sink is not None:
+        sink.write(*fields)
+
+
+def close():
+    """Flush and close all sinks."""
+    for name in list(sinks):
+        sinks.pop(name).close()
@@ -0,0 +1,177 @@
+import numpy as np
+
+from utils.candles import KLINE_DTYPE, UNITS_MS, CandleStore, interval_to_ms
+from utils.indicators import WilderRSI
+import utils.metrics as metrics
+
+DAY_MS = UNITS_MS['d']
+
+
+def check_interval(interval, base):
+    """Raise ValueError unless the interval can be rolled up from the base interval's candles."""
+    if not interval[:-1].isdigit() or interval[-1] not in UNITS_MS:
+        raise ValueError(f'Unknown interval {interval!r}')
+
+    interval_ms = interval_to_ms(interval)
+
+    # NOTE: Binance opens these on UTC midnight, so bars are aligned on multiples of their length
+    if interval_ms % interval_to_ms(base) or DAY_MS % interval_ms:
+        raise ValueError(f'Interval {interval!r} must be a multiple of {base!r} dividing a day')
+
+
+def contains(times, values):
+    """Return which rows of `times` hold the row's value, looking in the most recent columns first."""
+    found = (times[:, -1] == values) | (times[:, -2] == values)  # i.e. nothing or a candle closed since
+
+    # Only rows which fell further behind (or were never seeded) need the full scan
+    rest = np.flatnonzero(~found)
+    found[rest] = (times[rest] == values[rest, None]).any(axis=1)
+
+    return found
+
+
+def combine(first, then):
+    """Return the candles spanning each of `first` followed by the same row of `then`."""
+    combined = first.copy()
+
+    combined['high'] = np.maximum(first['high'], then['high'])
+    combined['low'] = np.minimum(first['low'], then['low'])
+    combined['close'] = then['close']
+    combined['volume'] += then['volume']
+
+    return combined
+
+
+class Timeframe:
+    def __init__(self, interval, symbols, size, store=None):
+        """Candles and incremental RSIs of all symbols at one interval.
+
+        Without `store`, candles are rolled up in memory from a base timeframe's (see `roll_up`).
+        """
+        self.interval = interval
+        self.interval_ms = interval_to_ms(interval)
+        self.rolled = store is None
+        self.store = CandleStore(symbols, size) if store is None else store
+
+        self.RSI = WilderRSI(n=len(symbols))
+        self.RSI_times = np.full(len(symbols), -1, dtype=np.int64)  # last candle committed to each row's RSI
+
+        # Closed base candles folded so far into each row's forming candle, and the last one's open time
+        self.partial = np.zeros(len(symbols), dtype=KLINE_DTYPE)
+        self.folded = np.full(len(symbols), -1, dtype=np.int64)
+
+    def __str__(self):
+        return f'Timeframe({self.interval}, {self.store})'
+
+    def state(self):
+        """Return the candle buffers and RSI state as arrays, by name."""
+        arrays = {
+            'candles': self.store.candles.copy(), 'heads': self.store.heads.copy(),
+            'counts': self.store.counts.copy(), 'avg_gain': self.RSI.avg_gain,
+            'avg_loss': self.RSI.avg_loss, 'last_close': self.RSI.last_close,
+            'RSI_times': self.RSI_times.copy(),
+        }
+
+        if self.rolled:
+            arrays.update({'partial': self.partial.copy(), 'folded': self.folded.copy()})
+
+        return arrays
+
+    def restore(self, rows, arrays, sources):
+        """Restore the given rows from the `sources` rows of `state()` arrays."""
+        store = self.store
+
+        store.candles[rows] = arrays['candles'][sources]
+        store.heads[rows], store.counts[rows] = arrays['heads'][sources], arrays['counts'][sources]
+
+        self.RSI.avg_gain[rows] = arrays['avg_gain'][sources]
+        self.RSI.avg_loss[rows] = arrays['avg_loss'][sources]
+        self.RSI.last_close[rows] = arrays['last_close'][sources]
+        self.RSI_times[rows] = arrays['RSI_times'][sources]
+
+        if self.rolled:
+            self.partial[rows], self.folded[rows] = arrays['partial'][sources], arrays['folded'][sources]
+
+    @metrics.timed('RSI')
+    def update_RSIs(self, times, closes):
+        """Commit all newly closed candles to the RSI state. Return the forming candles' RSIs."""
+        committed = times[:, :-1]  # the last column is still forming
+
+        # Seed rows which are new, not full yet, or whose last committed candle left the buffer (gap)
+        seeded = contains(committed, self.RSI_times) & ~np.isnan(self.RSI.avg_gain)
+
+        if not seeded.all():
+            self.RSI.seed(closes[:, :-1], rows=~seeded)
+
+        # Commit the candles closed since the last scan, one column at a time (usually just one)
+        new = seeded[:, None] & (committed > self.RSI_times[:, None])
+
+        for j in np.flatnonzero(new.any(axis=0)):
+            self.RSI.update(closes[:, j], mask=new[:, j])
+
+        self.RSI_times[:] = committed[:, -1]
+
+        RSIs = self.RSI.peek(closes[:, -1])
+
+        # Rows without `period` closed changes yet get one from their forming candle, like talib would
+        cold = np.isnan(self.RSI.avg_gain)
+
+        if cold.any():
+            provisional = WilderRSI(self.RSI.period, n=np.count_nonzero(cold))
+            provisional.seed(closes[cold])
+            RSIs[cold] = provisional.value()
+
+        return RSIs
+
+    @metrics.timed('roll_up')
+    def roll_up(self, candles):
+        """
+        Fold the base candles closed since the last call, then the forming one, into this timeframe's.
+
+        `candles` is the base store's matrix. Return the mask of rows which cannot be rolled up (new,
+        or whose last folded candle left the base buffer) and need to be loaded (see `load`) first.
+        """
+        committed = candles['time'][:, :-1]  # the last column is still forming
+
+        seeded = contains(committed, self.folded) & (self.folded >= 0)
+
+        new = seeded[:, None] & (committed > self.folded[:, None])
+
+        for j in np.flatnonzero(new.any(axis=0)):
+            self.fold(candles[:, j], new[:, j])
+
+        # The forming candle spans the folded closed candles, if still in the same bar, and the forming one
+        self.store.put(seeded, self.extend(self.partial, candles[:, -1]))
+
+        # Rows with a single base candle cannot be loaded yet either
+        return ~seeded & (committed[:, -1] >= 0)
+
+    def fold(self, candles, mask):
+        """Commit closed base candles (of the masked rows) to the rows' forming candles."""
+        self.partial[mask] = self.extend(self.partial, candles)[mask]
+        self.folded[mask] = candles['time'][mask]
+
+        # Store the bar as it stands: it is final once the next one opens
+        self.store.put(mask, self.partial)
+
+    def extend(self, partial, candles):
+        """Return the bars resulting from adding each row's base candle to its partial bar."""
+        opens = candles['time'] - candles['time'] % self.interval_ms
+
+        extended = combine(partial, candles)
+        opened = opens != partial['time']
+        extended[opened] = candles[opened]  # the base candle opens a new bar
+        extended['time'] = opens
+
+        return extended
+
+    def load(self, i, klines, folded):
+        """Overwrite the row with klines fetched at this interval, rolling up base candles after `folded`.
+
+        The last kline is the forming bar, so it already counts (most of) the base candle forming
+        when fetched: only the volume of its first seconds is counted twice.
+        """
+        self.store.load(i, klines)
+
+        self.partial[i] = klines[-1]
+        self.folded[i] = folded
@@ -0,0 +1,159 @@
+import json
+import time
+from collections import OrderedDict, namedtuple
+from threading import Event, Lock, Thread
+
+import ccxt
+import websocket
+from loguru import logger
+
+import utils.retry as retry
+
+USER_STREAM_URL = 'wss://fstream.binance.com/ws/'
+KEEPALIVE_INTERVAL = 30 * 60  # seconds between listenKey renewals (they expire after 60 minutes)
+MAX_RECONNECT_DELAY = 60      # seconds
+MAX_FILLS = 10_000            # order fills remembered (oldest forgotten first)
+
+# Execution state of an order, as pushed by ORDER_TRADE_UPDATE events. The commission is in USDT,
+# or None if any was paid in another asset (e.g. BNB), for the fee to be estimated instead
+Fill = namedtuple('Fill', ['symbol', 'status', 'price', 'filled', 'commission'])
+
+
+class UserStream:
+    def __init__(self, exchange, url=USER_STREAM_URL):
+        """Follow the account's order fills and balances from Binance's user-data stream."""
+        self.exchange = exchange
+        self.url = url
+
+        self.fills = OrderedDict()  # order ID (str) -> Fill
+        self.lock = Lock()
+        self.subscribers = []       # functions called with (allocated, available) on balance updates
+
+        self.listen_key = None
+        self.connected = Event()
+        self.running = False
+        self.ws, self.threads = None, []
+
+    def __str__(self):
+        return f'UserStream({len(self.fills)} fills, {len(self.subscribers)} accounts)'
+
+    def start(self):
+        """Consume the stream and renew its listenKey, each in its own thread."""
+        self.running = True
+
+        for target in (self.run, self.keep_alive):
+            thread = Thread(target=target, daemon=True)
+            thread.start()
+
+            self.threads.append(thread)
+
+    def stop(self):
+        """Close the connection and stop reconnecting."""
+        self.running = False
+
+        if self.ws is not None:
+            self.ws.close()
+
+    def subscribe(self, function):
+        """Call `function(allocated, available)` whenever the USDT balance changes."""
+        self.subscribers.append(function)
+
+    def fill(self, order_id):
+        """Return the last known Fill of the order, or None."""
+        with self.lock:
+            return self.fills.get(str(order_id))
+
+    def exit_trigger(self, position):
+        """Return 'SL' or 'TP' if the position's stop-loss or take-profit order has filled, else None."""
+        for trigger, order_id in (('SL', position.sl_id), ('TP', position.tp_id)):
+            fill = self.fill(order_id)
+
+            if fill is not None and fill.status == 'FILLED':
+                return trigger
+
+        return None
+
+    def run(self):
+        """Consume the stream forever, reconnecting (with a new listenKey) with exponential backoff."""
+        delay = 1
+
+        while self.running:
+            connected_at = time.time()
+
+            try:
+                self.listen_key = retry.call('listen_key', self.exchange.fapiPrivate_post_listenkey)['listenKey']
+            except ccxt.BaseError as e:
+                logger.error(f'Failed creating a listenKey: {e}')
+            else:
+                self.ws = websocket.WebSocketApp(
+                    self.url + self.listen_key,
+                    on_open=lambda ws: self.connected.set(),
+                    on_message=self.on_message,
+                    on_error=lambda ws, e: logger.error(f'User stream error: {e}'),
+                )
+                self.ws.run_forever(ping_interval=60, ping_timeout=10)
+
+            self.connected.clear()
+
+            if not self.running:
+                break
+
+            # NOTE: events missed while disconnected fall back to REST (see `Position.close`)
+            delay = 1 if time.time() - connected_at > MAX_RECONNECT_DELAY else min(delay * 2, MAX_RECONNECT_DELAY)
+
+            logger.warning(f'User stream disconnected; reconnecting in {delay}s...')
+            time.sleep(delay)
+
+    def keep_alive(self):
+        """Renew the listenKey before it expires."""
+        while self.running:
+            time.sleep(KEEPALIVE_INTERVAL)
+
+            try:
+                retry.call('listen_key', self.exchange.fapiPrivate_put_listenkey)
+            except ccxt.BaseError as e:
+                logger.error(f'Failed renewing the listenKey: {e}')
+
+    def on_message(self, ws, message):
+        event = json.loads(message)
+        kind = event.get('e')
+
+        if kind == 'ORDER_TRADE_UPDATE':
+            self.on_order(event['o'])
+        elif kind == 'ACCOUNT_UPDATE':
+            self.on_account(event['a'])
+        elif kind == 'listenKeyExpired':
+            logger.warning('listenKey expired, reconnecting...')
+            ws.close()
+
+    def on_order(self, order):
+        """Record the order's fill, accumulating the (USDT) commission of its trades."""
+        order_id = str(order['i'])
+        fee = float(order.get('n', 0))
+
+        with self.lock:
+            previous = self.fills.get(order_id)
+            commission = previous.commission if previous is not None else 0.0
+
+            if fee and commission is not None:
+                commission = commission + fee if order.get('N') == 'USDT' else None
+
+            self.fills[order_id] = Fill(
+                order['s'], order['X'], float(order['ap']), float(order['z']), commission
+            )
+            self.fills.move_to_end(order_id)
+
+            while len(self.fills) > MAX_FILLS:
+                self.fills.popitem(last=False)
+
+    def on_account(self, update):
+        """Push the USDT balance to the subscribed accounts."""
+        for balance in update.get('B', []):
+            if balance['a'] != 'USDT':
+                continue
+
+            # Isolated margins are part of the wallet balance, but not of the cross wallet one
+            wallet, cross = float(balance['wb']), float(balance['cw'])
+
+            for function in self.subscribers:
+                function(wallet - cross, cross)
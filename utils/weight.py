@@ -0,0 +1,90 @@
+import time
+from threading import Condition
+
+from loguru import logger
+
+WEIGHT_LIMIT = 2400  # request weight allowed per IP and minute
+RATE_LIMITED = (418, 429)  # statuses of requests over the limit (418: IP banned after ignoring 429s)
+
+# Request priorities, most urgent first
+ORDERS, ACCOUNT, MARKET_DATA = 0, 1, 2
+
+# Weight each priority leaves untouched for more urgent traffic when the budget is tight
+RESERVED = {ORDERS: 0, ACCOUNT: 200, MARKET_DATA: 400}
+
+condition = Condition()
+used_weight, weight_minute = 0, 0  # weight spent in the current minute, shared by all threads
+banned_until = 0.0                 # time until which no request may be sent
+waiting = [0, 0, 0]                # requests waiting for weight, by priority
+weight_used = [0, 0, 0]            # total weight taken since startup, by priority
+
+
+def acquire(weight, priority=MARKET_DATA):
+    """
+    Block until the request weight fits in the current minute's budget, then take it.
+
+    Binance refills the whole budget at every minute, so the bucket does too. Requests only
+    take weight above their priority's reserve, and wait while more urgent ones are waiting.
+    """
+    global used_weight, weight_minute
+
+    with condition:
+        waiting[priority] += 1
+
+        try:
+            while True:
+                now = time.time()
+                minute = int(now // 60)
+
+                if minute != weight_minute:
+                    used_weight, weight_minute = 0, minute
+
+                # A request heavier than the reserve allows still goes through on an idle minute
+                budget = max(WEIGHT_LIMIT - RESERVED[priority], min(weight, WEIGHT_LIMIT))
+
+                if now >= banned_until and not any(waiting[:priority]) and used_weight + weight <= budget:
+                    used_weight += weight
+                    weight_used[priority] += weight
+                    return
+
+                condition.wait(max(banned_until - now, 0) or 60 - now % 60)
+        finally:
+            waiting[priority] -= 1
+            condition.notify_all()  # less urgent requests may be let through now
+
+
+def observe(headers, status=200):
+    """Sync the budget with the weight Binance counted (also counts other clients) and its bans."""
+    global used_weight, banned_until
+
+    header = headers.get('X-MBX-USED-WEIGHT-1M')
+
+    with condition:
+        if header is not None and int(time.time() // 60) == weight_minute:
+            used_weight = max(used_weight, int(header))
+
+        if status in RATE_LIMITED:
+            retry_after = headers.get('Retry-After')
+            banned_until = max(banned_until, time.time() + (int(retry_after) if retry_after else 60))
+
+            logger.critical(
+                f'HTTP {status}: rate limited, holding every request for {banned_until - time.time():.0f}s'
+            )
+
+        condition.notify_all()
+
+
+def remaining():
+    """Return the weight left in the current minute."""
+    with condition:
+        return WEIGHT_LIMIT - used_weight if int(time.time() // 60) == weight_minute else WEIGHT_LIMIT
+
+
+def samples():
+    """Return the weight budget as (kind, name, labels, value) samples (see `utils.metrics`)."""
+    return [
+        ('gauge', 'weight_remaining', (), remaining()),
+    ] + [
+        ('counter', 'weight', (('priority', name),), weight_used[priority])
+        for priority, name in ((ORDERS, 'orders'), (ACCOUNT, 'account'), (MARKET_DATA, 'market_data'))
+    ]